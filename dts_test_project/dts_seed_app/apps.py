@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class SeedAppConfig(AppConfig):
+    name = "dts_seed_app"
+    verbose_name = "DTS Seed App"
+    default_auto_field = "django.db.models.BigAutoField"
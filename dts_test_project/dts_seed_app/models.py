@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class Place(models.Model):
+    """
+    Parent model of a multi-table inheritance, to test seeding
+    """
+    name = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.name
+
+
+class Restaurant(Place):
+    serves_pizza = models.BooleanField(default=False)
@@ -78,7 +78,16 @@ DATABASES = {
         "PASSWORD": "dts_test_project",
         "HOST": "localhost",
         "PORT": int(os.getenv("DB_5432_TCP_PORT"))
-    }
+    },
+    # for the tests moving tenants between databases
+    "other": {
+        "ENGINE": "tenant_schemas.postgresql_backend",
+        "NAME": "dts_test_project_other",
+        "USER": "dts_test_project",
+        "PASSWORD": "dts_test_project",
+        "HOST": "localhost",
+        "PORT": int(os.getenv("DB_5432_TCP_PORT"))
+    },
 }
 
 DATABASE_ROUTERS = ("tenant_schemas.routers.TenantSyncRouter",)
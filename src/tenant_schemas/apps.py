@@ -3,7 +3,11 @@ from django.conf import settings
 from django.core.checks import Critical, Error, Warning, register
 from django.core.files.storage import default_storage
 from tenant_schemas.storage import TenantStorageMixin
-from tenant_schemas.utils import get_public_schema_name, get_tenant_model
+from tenant_schemas.utils import (
+    get_public_schema_name,
+    get_template_schema_name,
+    get_tenant_model,
+)
 
 
 class TenantSchemaConfig(AppConfig):
@@ -75,6 +79,11 @@ def best_practice(app_configs, **kwargs):
                 "Do not include tenant schemas (%s) on PG_EXTRA_SEARCH_PATHS."
                 % ", ".join(sorted(invalid_schemas))))
 
+    if get_template_schema_name() == get_public_schema_name():
+        errors.append(Critical(
+            "TENANT_TEMPLATE_SCHEMA can not be the public schema (%s)."
+            % get_public_schema_name()))
+
     if not settings.SHARED_APPS:
         errors.append(
             Warning("SHARED_APPS is empty.",
@@ -94,6 +103,15 @@ def best_practice(app_configs, **kwargs):
                   hint=[a for a in settings.SHARED_APPS if a in delta],
                   id="tenant_schemas.E003"))
 
+    for app_set, app_set_apps in getattr(settings, 'TENANT_APP_SETS', {}).items():
+        if not set(app_set_apps).issubset(settings.TENANT_APPS):
+            delta = set(app_set_apps).difference(settings.TENANT_APPS)
+            errors.append(
+                Error("The %s app set of TENANT_APP_SETS has apps that are not "
+                      "in TENANT_APPS" % app_set,
+                      hint=[a for a in app_set_apps if a in delta],
+                      id="tenant_schemas.E004"))
+
     if not isinstance(default_storage, TenantStorageMixin):
         errors.append(
             Warning(
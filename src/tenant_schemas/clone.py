@@ -0,0 +1,285 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from tenant_schemas.postgresql_backend.base import _check_schema_name
+from tenant_schemas.utils import (
+    app_labels,
+    get_template_schema_name,
+    schema_context,
+    schema_exists,
+)
+
+SEQUENCES_SQL = """
+SELECT s.relname, format_type(seq.seqtypid, NULL), seq.seqstart, seq.seqincrement,
+       seq.seqmin, seq.seqmax, seq.seqcache, seq.seqcycle, ps.last_value,
+       d.deptype, t.relname, a.attname
+FROM pg_catalog.pg_class s
+JOIN pg_catalog.pg_namespace n ON n.oid = s.relnamespace
+JOIN pg_catalog.pg_sequence seq ON seq.seqrelid = s.oid
+JOIN pg_catalog.pg_sequences ps ON ps.schemaname = n.nspname AND ps.sequencename = s.relname
+LEFT JOIN pg_catalog.pg_depend d ON d.objid = s.oid
+    AND d.classid = 'pg_catalog.pg_class'::regclass
+    AND d.refclassid = 'pg_catalog.pg_class'::regclass
+    AND d.deptype IN ('a', 'i')
+LEFT JOIN pg_catalog.pg_class t ON t.oid = d.refobjid
+LEFT JOIN pg_catalog.pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+WHERE n.nspname = %s AND s.relkind = 'S'
+ORDER BY s.oid
+"""
+
+TABLES_SQL = """
+SELECT c.relname,
+       array_agg(a.attname ORDER BY a.attnum) FILTER (WHERE a.attgenerated = ''),
+       bool_or(a.attidentity <> '')
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE n.nspname = %s AND c.relkind = 'r'
+GROUP BY c.oid, c.relname
+ORDER BY c.oid
+"""
+
+DEFAULTS_SQL = """
+SELECT c.relname, a.attname, pg_catalog.pg_get_expr(d.adbin, d.adrelid)
+FROM pg_catalog.pg_attrdef d
+JOIN pg_catalog.pg_class c ON c.oid = d.adrelid
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_catalog.pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum
+WHERE n.nspname = %s AND c.relkind = 'r' AND a.attgenerated = ''
+"""
+
+CONSTRAINTS_SQL = """
+SELECT c.relname, con.conname, pg_catalog.pg_get_constraintdef(con.oid)
+FROM pg_catalog.pg_constraint con
+JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %s AND c.relkind = 'r' AND con.contype IN ('p', 'u', 'x', 'c', 'f')
+ORDER BY con.contype = 'f', con.oid
+"""
+
+INDEXES_SQL = """
+SELECT regexp_replace(pg_catalog.pg_get_indexdef(i.indexrelid),
+                      ' ON (ONLY )?' || quote_ident(%s) || '\\.',
+                      ' ON \\1' || quote_ident(%s) || '.')
+FROM pg_catalog.pg_index i
+JOIN pg_catalog.pg_class c ON c.oid = i.indexrelid
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %s
+  AND NOT EXISTS (SELECT 1 FROM pg_catalog.pg_constraint con
+                  WHERE con.conindid = i.indexrelid AND con.conrelid = i.indrelid)
+ORDER BY c.oid
+"""
+
+VIEWS_SQL = """
+SELECT c.relname, c.relkind, pg_catalog.pg_get_viewdef(c.oid)
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %s AND c.relkind IN ('v', 'm')
+ORDER BY c.oid
+"""
+
+
+class SchemaCloner(object):
+    """
+    Copies the sequences, tables, defaults, constraints, indexes, views and
+    optionally the rows of a schema into a new schema. Everything runs as
+    SQL statements inside the database, in a single transaction.
+
+    Definitions are read from the catalog while the search_path only
+    contains the base schema, so references to its own objects come out
+    unqualified and are resolved against the new schema when the
+    definitions are replayed with the search_path set to it.
+    """
+
+    def __init__(self, base_schema_name, new_schema_name):
+        _check_schema_name(base_schema_name)
+        _check_schema_name(new_schema_name)
+        self.base_schema_name = base_schema_name
+        self.new_schema_name = new_schema_name
+        self.quote_name = connection.ops.quote_name
+
+    def clone(self, include_data=True):
+        with transaction.atomic():
+            cursor = connection.cursor()
+            cursor.execute("SELECT current_setting('search_path')")
+            search_path = cursor.fetchone()[0]
+            self._set_search_path(cursor, self.base_schema_name)
+            cursor.execute(SEQUENCES_SQL, (self.base_schema_name, ))
+            sequences = cursor.fetchall()
+            cursor.execute(TABLES_SQL, (self.base_schema_name, ))
+            tables = cursor.fetchall()
+            cursor.execute(DEFAULTS_SQL, (self.base_schema_name, ))
+            defaults = cursor.fetchall()
+            cursor.execute(CONSTRAINTS_SQL, (self.base_schema_name, ))
+            constraints = cursor.fetchall()
+            cursor.execute(INDEXES_SQL, (self.base_schema_name, self.new_schema_name,
+                                         self.base_schema_name))
+            indexes = [row[0] for row in cursor.fetchall()]
+            cursor.execute(VIEWS_SQL, (self.base_schema_name, ))
+            views = cursor.fetchall()
+
+            cursor.execute('CREATE SCHEMA %s' % self.new_schema_name)
+            self._set_search_path(cursor, self.new_schema_name)
+            self.create_sequences(cursor, sequences)
+            self.create_tables(cursor, tables, defaults)
+            self.set_sequences_owner(cursor, sequences)
+            if include_data:
+                self.copy_rows(cursor, tables)
+                self.set_sequences_values(cursor, sequences)
+            self.create_constraints(cursor, constraints)
+            for sql in indexes:
+                cursor.execute(sql)
+            self.create_views(cursor, views)
+
+            # Put the search_path back for the rest of the transaction.
+            cursor.execute("SELECT set_config('search_path', %s, true)", (search_path, ))
+
+    def _set_search_path(self, cursor, schema_name):
+        cursor.execute("SELECT set_config('search_path', %s, true)", (schema_name, ))
+
+    def create_sequences(self, cursor, sequences):
+        for (name, data_type, start, increment, minimum, maximum, cache, cycle,
+             last_value, deptype, table, column) in sequences:
+            if deptype == 'i':
+                # Identity sequences are created along with their table.
+                continue
+            cursor.execute(
+                'CREATE SEQUENCE %s AS %s INCREMENT BY %d MINVALUE %d MAXVALUE %d '
+                'START WITH %d CACHE %d %s' % (
+                    self.quote_name(name), data_type, increment, minimum, maximum,
+                    start, cache, 'CYCLE' if cycle else 'NO CYCLE'))
+
+    def create_tables(self, cursor, tables, defaults):
+        for name, columns, has_identity in tables:
+            cursor.execute(
+                'CREATE TABLE %s (LIKE %s.%s INCLUDING DEFAULTS INCLUDING IDENTITY '
+                'INCLUDING GENERATED INCLUDING STORAGE INCLUDING COMMENTS)' % (
+                    self.quote_name(name), self.base_schema_name, self.quote_name(name)))
+
+        # LIKE copies default expressions verbatim, so nextval() calls still
+        # point at the sequences of the base schema. Re-parse them here.
+        for table, column, expression in defaults:
+            cursor.execute('ALTER TABLE %s ALTER COLUMN %s SET DEFAULT %s' % (
+                self.quote_name(table), self.quote_name(column), expression))
+
+    def set_sequences_owner(self, cursor, sequences):
+        for name, *_, deptype, table, column in sequences:
+            if deptype == 'a':
+                cursor.execute('ALTER SEQUENCE %s OWNED BY %s.%s' % (
+                    self.quote_name(name), self.quote_name(table), self.quote_name(column)))
+
+    def copy_rows(self, cursor, tables):
+        for name, columns, has_identity in tables:
+            columns = ', '.join(self.quote_name(column) for column in columns)
+            cursor.execute('INSERT INTO %s (%s) %s SELECT %s FROM %s.%s' % (
+                self.quote_name(name), columns,
+                'OVERRIDING SYSTEM VALUE' if has_identity else '',
+                columns, self.base_schema_name, self.quote_name(name)))
+
+    def set_sequences_values(self, cursor, sequences):
+        for name, *_, last_value, deptype, table, column in sequences:
+            if last_value is None:
+                continue
+            if deptype == 'i':
+                # Identity sequences may have been given another name.
+                cursor.execute('SELECT setval(pg_get_serial_sequence(%s, %s), %s)', (
+                    '%s.%s' % (self.new_schema_name, self.quote_name(table)), column,
+                    last_value))
+            else:
+                cursor.execute('SELECT setval(%s, %s)', (
+                    '%s.%s' % (self.new_schema_name, self.quote_name(name)), last_value))
+
+    def create_constraints(self, cursor, constraints):
+        for table, name, definition in constraints:
+            cursor.execute('ALTER TABLE %s ADD CONSTRAINT %s %s' % (
+                self.quote_name(table), self.quote_name(name), definition))
+
+    def create_views(self, cursor, views):
+        for name, kind, definition in views:
+            cursor.execute('CREATE %s %s AS %s' % (
+                'MATERIALIZED VIEW' if kind == 'm' else 'VIEW',
+                self.quote_name(name), definition.rstrip().rstrip(';')))
+
+
+def clone_schema(base_schema_name, new_schema_name, include_data=True):
+    """
+    Creates the schema new_schema_name as a copy of base_schema_name,
+    including its rows unless include_data is False.
+    """
+    SchemaCloner(base_schema_name, new_schema_name).clone(include_data=include_data)
+
+
+def create_template_schema(verbosity=1):
+    """
+    Creates and migrates the template schema set in TENANT_TEMPLATE_SCHEMA.
+    Returns true if the schema was created, false if it already existed.
+    """
+    schema_name = get_template_schema_name()
+    _check_schema_name(schema_name)
+
+    if schema_exists(schema_name):
+        return False
+
+    cursor = connection.cursor()
+    cursor.execute('CREATE SCHEMA %s' % schema_name)
+    call_command('migrate_schemas',
+                 schema_name=schema_name,
+                 interactive=False,
+                 verbosity=verbosity)
+    connection.set_schema_to_public()
+    return True
+
+
+def get_tenant_apps_models(tenant_apps=None):
+    """
+    Returns the concrete models stored in the tenant schemas, including
+    the automatically created many-to-many tables, of tenant_apps or
+    TENANT_APPS.
+    """
+    if tenant_apps is None:
+        tenant_apps = settings.TENANT_APPS
+    return [
+        model
+        for app_label in app_labels(tenant_apps)
+        for model in apps.get_app_config(app_label).get_models(include_auto_created=True)
+        if model._meta.managed and not model._meta.proxy
+    ]
+
+
+def copy_schema_data(base_schema_name, new_schema_name, tenant_apps=None):
+    """
+    Replaces the rows of the tables of tenant_apps, TENANT_APPS by default,
+    in new_schema_name with the ones of base_schema_name, using INSERT ...
+    SELECT statements run by the database in a single transaction, then
+    resets the sequences of these tables to their highest value.
+    """
+    _check_schema_name(base_schema_name)
+    _check_schema_name(new_schema_name)
+    quote_name = connection.ops.quote_name
+    models = get_tenant_apps_models(tenant_apps)
+    db_tables = {model._meta.db_table for model in models}
+
+    with transaction.atomic():
+        cursor = connection.cursor()
+        cursor.execute(TABLES_SQL, (base_schema_name, ))
+        tables = [table for table in cursor.fetchall() if table[0] in db_tables]
+        if not tables:
+            return
+
+        cursor.execute('TRUNCATE %s' % ', '.join(
+            '%s.%s' % (new_schema_name, quote_name(name)) for name, columns, has_identity in tables))
+        for name, columns, has_identity in tables:
+            columns = ', '.join(quote_name(column) for column in columns)
+            cursor.execute('INSERT INTO %s.%s (%s) %s SELECT %s FROM %s.%s' % (
+                new_schema_name, quote_name(name), columns,
+                'OVERRIDING SYSTEM VALUE' if has_identity else '',
+                columns, base_schema_name, quote_name(name)))
+
+        # The reset statements use unqualified table names.
+        with schema_context(new_schema_name):
+            cursor = connection.cursor()
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
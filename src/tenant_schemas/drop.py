@@ -0,0 +1,88 @@
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.transaction import TransactionManagementError
+
+from tenant_schemas.pool import _like_prefix
+from tenant_schemas.postgresql_backend.base import _check_schema_name
+from tenant_schemas.utils import is_lock_timeout
+
+# Schemas of deleted tenants waiting to be dropped in the background are
+# renamed with this prefix.
+DELETED_PREFIX = 'ts_deleted_'
+
+TABLES_SQL = """
+SELECT c.relname
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %s AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+ORDER BY c.oid
+"""
+
+
+def _execute_with_lock_timeout(sql, lock_timeout, retries, backoff):
+    """
+    Executes sql in its own transaction with lock_timeout (in milliseconds),
+    retrying with an exponential backoff if the lock can't be acquired.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic():
+                cursor = connection.cursor()
+                cursor.execute("SELECT set_config('lock_timeout', %s, true)",
+                               ('%dms' % lock_timeout, ))
+                cursor.execute(sql)
+            return
+        except OperationalError as e:
+            if not is_lock_timeout(e) or attempt == retries:
+                raise
+        time.sleep(backoff * 2 ** attempt)
+
+
+def drop_schema_incrementally(schema_name, batch_size=None, lock_timeout=None, retries=None,
+                              backoff=1):
+    """
+    Drops the tables of the schema batch_size at a time, each batch in its
+    own transaction, then drops the empty schema. Keeps the number of locks
+    held at once low instead of locking every object of the schema in a
+    single DROP SCHEMA ... CASCADE.
+
+    Every statement waits at most lock_timeout milliseconds for its locks
+    and is retried up to retries times with an exponential backoff.
+    """
+    _check_schema_name(schema_name)
+    if connection.in_atomic_block:
+        raise TransactionManagementError(
+            "Schemas can't be dropped incrementally inside a transaction.")
+
+    if batch_size is None:
+        batch_size = getattr(settings, 'TENANT_DROP_SCHEMA_BATCH_SIZE', 20)
+    if lock_timeout is None:
+        lock_timeout = getattr(settings, 'TENANT_DROP_SCHEMA_LOCK_TIMEOUT', 5000)
+    if retries is None:
+        retries = getattr(settings, 'TENANT_DROP_SCHEMA_RETRIES', 5)
+
+    quote_name = connection.ops.quote_name
+    cursor = connection.cursor()
+    cursor.execute(TABLES_SQL, (schema_name, ))
+    tables = [row[0] for row in cursor.fetchall()]
+
+    for i in range(0, len(tables), batch_size):
+        _execute_with_lock_timeout(
+            'DROP TABLE IF EXISTS %s CASCADE' % ', '.join(
+                '%s.%s' % (schema_name, quote_name(table)) for table in tables[i:i + batch_size]),
+            lock_timeout, retries, backoff)
+
+    _execute_with_lock_timeout('DROP SCHEMA IF EXISTS %s CASCADE' % schema_name,
+                               lock_timeout, retries, backoff)
+
+
+def deleted_schemas():
+    """
+    Returns the schemas of deleted tenants that are still waiting to be dropped.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT nspname FROM pg_catalog.pg_namespace WHERE nspname LIKE %s "
+                   "ORDER BY nspname", (_like_prefix(DELETED_PREFIX), ))
+    return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,116 @@
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+logger = logging.getLogger('tenant_schemas.explain')
+
+# Prevents the EXPLAIN statement itself from being timed and explained.
+_EXPLAINING = ContextVar('ts_explaining', default=False)
+
+# Statements that can be explained without executing them.
+EXPLAINABLE_STATEMENTS = ('select', 'insert', 'update', 'delete', 'with')
+
+
+class SampledExplainWrapper(object):
+    """
+    Database execute wrapper that captures the plan of slow queries.
+
+    Queries slower than the threshold of the current schema are sampled at
+    ``sample_rate`` and explained with ``EXPLAIN (FORMAT JSON)`` on the same
+    connection, so under the same ``search_path``. The plan is handed to
+    ``record`` together with the schema name.
+
+    It can be installed for a block of code::
+
+        with connection.execute_wrapper(SampledExplainWrapper()):
+            ...
+
+    or on every connection with ``TENANT_EXPLAIN_SLOW_QUERIES = True``.
+    """
+
+    def __init__(self, threshold=None, sample_rate=None, schema_thresholds=None):
+        if threshold is None:
+            threshold = getattr(settings, 'TENANT_EXPLAIN_THRESHOLD', 500)
+        if sample_rate is None:
+            sample_rate = getattr(settings, 'TENANT_EXPLAIN_SAMPLE_RATE', 0.01)
+        if schema_thresholds is None:
+            schema_thresholds = getattr(settings, 'TENANT_EXPLAIN_SCHEMA_THRESHOLDS', {})
+
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.schema_thresholds = schema_thresholds
+
+    def __call__(self, execute, sql, params, many, context):
+        if _EXPLAINING.get():
+            return execute(sql, params, many, context)
+
+        start = time.monotonic()
+        result = execute(sql, params, many, context)
+        duration = (time.monotonic() - start) * 1000
+
+        connection = context['connection']
+        schema_name = connection.schema_name
+        if (not many and duration >= self.get_threshold(schema_name) and
+                self.is_explainable(sql) and random.random() < self.sample_rate):
+            plan = self.explain(connection, sql, params)
+            if plan is not None:
+                self.record(schema_name, sql, params, duration, plan)
+
+        return result
+
+    def get_threshold(self, schema_name):
+        """
+        Returns the latency threshold in milliseconds for the given schema.
+        """
+        return self.schema_thresholds.get(schema_name, self.threshold)
+
+    def is_explainable(self, sql):
+        words = sql.lstrip(' \t\n(').split(None, 1)
+        return bool(words) and words[0].lower() in EXPLAINABLE_STATEMENTS
+
+    def explain(self, connection, sql, params):
+        """
+        Returns the JSON plan of the query or None if it can't be explained.
+        Inside a transaction the EXPLAIN runs in a savepoint so a failure
+        doesn't abort the caller's transaction.
+        """
+        token = _EXPLAINING.set(True)
+        try:
+            if connection.in_atomic_block:
+                with transaction.atomic(using=connection.alias):
+                    return self._explain(connection, sql, params)
+            return self._explain(connection, sql, params)
+        except DatabaseError:
+            logger.debug('Could not explain query on schema %s', connection.schema_name,
+                         exc_info=True)
+            return None
+        finally:
+            _EXPLAINING.reset(token)
+
+    def _explain(self, connection, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) %s' % sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan
+
+    def record(self, schema_name, sql, params, duration, plan):
+        """
+        Stores the captured plan. By default it is logged to the
+        ``tenant_schemas.explain`` logger, override for other destinations.
+        """
+        logger.info(
+            json.dumps({
+                'schema_name': schema_name,
+                'duration': round(duration, 3),
+                'sql': sql,
+                'plan': plan,
+            }, default=str),
+            extra={'explain_schema_name': schema_name, 'explain_plan': plan},
+        )
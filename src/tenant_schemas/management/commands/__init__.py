@@ -197,24 +197,40 @@ class SyncCommon(BaseCommand):
             ),
         )
         parser.add_argument("-s", "--schema", dest="schema_name")
+        parser.add_argument(
+            "--schemas",
+            dest="schema_names",
+            nargs="+",
+            help="Synchronize only the given tenant schemas.",
+        )
         parser.add_argument(
             "--executor",
             action="store",
             dest="executor",
             default=None,
-            help="Executor for running migrations [standard (default)|parallel]",
+            help=(
+                "Executor for running migrations "
+                "[standard (default)|parallel|threaded|replay]"
+            ),
         )
 
     def handle(self, *args, **options):
         self.sync_tenant = options.get("tenant")
         self.sync_public = options.get("shared")
         self.schema_name = options.get("schema_name")
+        self.schema_names = options.get("schema_names")
         self.executor = options.get("executor")
         self.installed_apps = settings.INSTALLED_APPS
         self.args = args
         self.options = options
 
-        if self.schema_name:
+        if self.schema_names:
+            if self.sync_public or self.schema_name:
+                raise CommandError(
+                    "schemas should only be used with the --tenant switch."
+                )
+            self.sync_tenant = True
+        elif self.schema_name:
             if self.sync_public:
                 raise CommandError(
                     "schema should only be used with the --tenant switch."
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from tenant_schemas.utils import get_tenant_model
+
+
+class Command(BaseCommand):
+    help = (
+        "Replaces the data of a tenant with a copy of the data of another "
+        "tenant, copied inside the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Schema of the tenant to copy.")
+        parser.add_argument("target", help="Schema of the tenant to copy to.")
+
+    def handle(self, *args, **options):
+        TenantModel = get_tenant_model()
+        connection.set_schema_to_public()
+        tenants = {
+            tenant.schema_name: tenant
+            for tenant in TenantModel.objects.filter(
+                schema_name__in=[options["source"], options["target"]]
+            )
+        }
+        for schema_name in (options["source"], options["target"]):
+            if schema_name not in tenants:
+                raise CommandError("No tenant with schema %s." % schema_name)
+
+        tenants[options["target"]].clone_from(tenants[options["source"]])
+        if int(options["verbosity"]) >= 1:
+            self.stdout.write(
+                "Copied the data of %s to %s." % (options["source"], options["target"])
+            )
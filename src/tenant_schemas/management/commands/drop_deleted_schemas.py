@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from tenant_schemas.drop import deleted_schemas, drop_schema_incrementally
+
+
+class Command(BaseCommand):
+    help = (
+        "Drops the schemas of deleted tenants that were left behind by an "
+        "interrupted background drop."
+    )
+
+    def handle(self, *args, **options):
+        connection.set_schema_to_public()
+        for schema_name in deleted_schemas():
+            if int(options["verbosity"]) >= 1:
+                self.stdout.write(
+                    self.style.NOTICE("=== Dropping schema ")
+                    + self.style.SQL_TABLE(schema_name)
+                )
+            drop_schema_incrementally(schema_name)
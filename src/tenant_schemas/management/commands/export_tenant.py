@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from tenant_schemas.transfer import export_schema
+from tenant_schemas.utils import schema_exists
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports the tables of a tenant schema to an archive, streaming them "
+        "with COPY in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Path of the archive to write.")
+        parser.add_argument("-s", "--schema", dest="schema_name", required=True)
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=None,
+            help="Number of tables exported at once (defaults to TENANT_EXPORT_WORKERS).",
+        )
+
+    def handle(self, *args, **options):
+        connection.set_schema_to_public()
+        schema_name = options["schema_name"]
+        if not schema_exists(schema_name):
+            raise CommandError("Schema %s doesn't exist." % schema_name)
+
+        manifest = export_schema(schema_name, options["output"], workers=options["jobs"])
+        if int(options["verbosity"]) >= 1:
+            self.stdout.write(
+                "Exported %d tables of %s to %s."
+                % (len(manifest["tables"]), schema_name, options["output"])
+            )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from tenant_schemas.transfer import import_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Restores an archive written by export_tenant into a new schema. The "
+        "tenant itself has to be created afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archive", help="Path of the archive to restore.")
+        parser.add_argument(
+            "-s",
+            "--schema",
+            dest="schema_name",
+            default=None,
+            help="Name of the new schema (defaults to the exported one).",
+        )
+
+    def handle(self, *args, **options):
+        connection.set_schema_to_public()
+        verbosity = int(options["verbosity"])
+        try:
+            schema_name = import_schema(
+                options["archive"],
+                schema_name=options["schema_name"],
+                verbosity=max(verbosity - 1, 0),
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        if verbosity >= 1:
+            self.stdout.write("Restored %s into %s." % (options["archive"], schema_name))
@@ -1,15 +1,79 @@
+import sys
+from datetime import timedelta
+
 import django
+from django.conf import settings
+from django.core.management.base import CommandError
 from django.core.management.commands.migrate import Command as MigrateCommand
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.migrations.autodetector import MigrationAutodetector
 from django.db.migrations.exceptions import MigrationSchemaMissing
+from django.utils import timezone
 from tenant_schemas.management.commands import SyncCommon
 from tenant_schemas.migration_executors import get_executor
+from tenant_schemas.migration_executors.base import DONE, FAILED
+from tenant_schemas.migration_executors.estimate import (
+    INDEX,
+    METADATA,
+    REWRITE,
+    SCAN,
+    UNKNOWN,
+    estimate_migrations,
+)
+from tenant_schemas.migration_executors.journal import get_journal
+from tenant_schemas.migration_executors.lazy import (
+    get_lazy_migration_active_days,
+    get_migration_head,
+)
+from tenant_schemas.migration_executors.loader import cached_migration_loader
+from tenant_schemas.migration_executors.planning import plan_migrations
+from tenant_schemas.migration_executors.report import MigrationProgress, write_report
+from tenant_schemas.models import LazyMigrationTenantMixin, MultiDatabaseTenantMixin
+from tenant_schemas.pool import spare_schemas
+from tenant_schemas.signals import schema_migrated
 from tenant_schemas.utils import (
     get_public_schema_name,
+    get_template_schema_name,
     get_tenant_model,
     schema_exists,
+    schema_shard,
+    schema_sizes,
+    schemas_exist,
 )
 
+# Values of --order.
+LARGEST_FIRST = "largest-first"
+SMALLEST_FIRST = "smallest-first"
+
+
+def parse_shard(value):
+    """
+    Parses an INDEX/COUNT shard, INDEX going from 1 to COUNT.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise CommandError("--shard must be INDEX/COUNT, for instance 1/4.")
+    if not 1 <= index <= count:
+        raise CommandError("The shard index must be between 1 and %d." % count)
+    return index, count
+
+
+def read_schema_names(path):
+    """
+    Reads one schema name per line from the file, or from stdin if path is
+    "-". Blank lines and lines starting with # are ignored.
+    """
+    if path == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    return [
+        line.strip() for line in lines
+        if line.strip() and not line.strip().startswith("#")
+    ]
+
 
 class Command(SyncCommon):
     autodetector = MigrationAutodetector
@@ -29,32 +93,373 @@ class Command(SyncCommon):
                 help='Skip system checks.',
             )
 
+        parser.add_argument(
+            "--skip-up-to-date",
+            action="store_true",
+            dest="skip_up_to_date",
+            default=False,
+            help=(
+                "Read the applied migrations of every tenant schema at once and "
+                "only migrate the schemas with pending migrations."
+            ),
+        )
+
+        parser.add_argument(
+            "--lock-timeout",
+            type=int,
+            dest="lock_timeout",
+            help=(
+                "Milliseconds a migration waits for its locks before the schema is "
+                "retried later, overrides TENANT_MIGRATION_LOCK_TIMEOUT."
+            ),
+        )
+        parser.add_argument(
+            "--journal",
+            dest="journal",
+            help=(
+                "Record the result of every tenant schema in this file, or in a "
+                "table of the public schema with 'db'."
+            ),
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            dest="resume",
+            default=False,
+            help="Skip the tenant schemas the journal records as migrated.",
+        )
+        parser.add_argument(
+            "--continue-on-error",
+            action="store_true",
+            dest="continue_on_error",
+            default=False,
+            help=(
+                "Keep migrating the other tenant schemas when one fails and "
+                "report the failures at the end."
+            ),
+        )
+        parser.add_argument(
+            "--progress",
+            action="store_true",
+            dest="progress",
+            default=False,
+            help="Show how many tenant schemas are migrated and the remaining time.",
+        )
+        parser.add_argument(
+            "--report",
+            dest="report",
+            help=(
+                "Write the timing and result of every tenant schema to this file, "
+                "as CSV if it ends with .csv and as JSON otherwise."
+            ),
+        )
+
+        parser.add_argument(
+            "--order",
+            dest="order",
+            choices=[LARGEST_FIRST, SMALLEST_FIRST],
+            default=getattr(settings, "TENANT_MIGRATION_ORDER", None),
+            help=(
+                "Migrate the largest tenant schemas first, so that they don't "
+                "finish last, or the smallest first, to be done with most of them "
+                "early."
+            ),
+        )
+        parser.add_argument(
+            "--lazy",
+            action="store_true",
+            dest="lazy",
+            default=False,
+            help=(
+                "Only migrate the tenants requested in the last "
+                "TENANT_LAZY_MIGRATION_ACTIVE_DAYS days, the others are migrated "
+                "on their first request."
+            ),
+        )
+        parser.add_argument(
+            "--estimate",
+            action="store_true",
+            dest="estimate",
+            default=False,
+            help=(
+                "Don't migrate, estimate how long the pending migrations of every "
+                "tenant schema take and lock their tables instead."
+            ),
+        )
+        parser.add_argument(
+            "--shard",
+            dest="shard",
+            help=(
+                "Only migrate the tenant schemas of shard INDEX/COUNT, from 1/COUNT "
+                "to COUNT/COUNT, shards being computed from the schema names. The "
+                "public schema is part of the first shard."
+            ),
+        )
+        parser.add_argument(
+            "--tenants-from",
+            dest="tenants_from",
+            help=(
+                "Only migrate the tenant schemas listed in this file, one per line, "
+                "or in stdin with '-'."
+            ),
+        )
+
         command = MigrateCommand()
         command.add_arguments(parser)
 
     def handle(self, *args, **options):
+        if options.get("tenants_from"):
+            if options.get("schema_names") or options.get("schema_name"):
+                raise CommandError(
+                    "--tenants-from can't be used with --schema or --schemas."
+                )
+            options["schema_names"] = read_schema_names(options["tenants_from"])
+            if not options["schema_names"]:
+                self.stdout.write("No tenant schemas in %s." % options["tenants_from"])
+                return
+
         super().handle(*args, **options)
+
+        self.shard = None
+        if self.options.get("shard"):
+            self.shard = parse_shard(self.options["shard"])
+            if self.shard[0] != 1:
+                self.sync_public = False
         self.PUBLIC_SCHEMA_NAME = get_public_schema_name()
 
-        executor = get_executor(codename=self.executor)(self.args, self.options)
+        database = options.get("database") or DEFAULT_DB_ALIAS
+        if not options.get("skip_checks"):
+            self.check(databases=[database])
+            # they don't have to run again for every schema
+            self.options["skip_checks"] = True
+
+        journal = None
+        if self.options.get("journal"):
+            journal = get_journal(self.options["journal"], using=database)
+        elif self.options.get("resume"):
+            raise CommandError("--resume requires --journal.")
+
+        executor = get_executor(codename=self.executor)(
+            self.args, self.options, journal=journal
+        )
 
         if self.sync_public and not self.schema_name:
             self.schema_name = self.PUBLIC_SCHEMA_NAME
 
-        if self.sync_public:
+        with cached_migration_loader():
+            self.run_migrations(executor, database)
+
+    def run_migrations(self, executor, database):
+        if self.sync_public and not self.options.get("estimate"):
             executor.run_migrations(tenants=[self.schema_name])
         if self.sync_tenant:
-            if self.schema_name and self.schema_name != self.PUBLIC_SCHEMA_NAME:
-                if not schema_exists(self.schema_name):
+            if self.schema_names:
+                existing = schemas_exist(self.schema_names, using=database)
+                missing = [name for name in self.schema_names if name not in existing]
+                if missing:
+                    raise MigrationSchemaMissing(
+                        'Schemas "{}" do not exist'.format('", "'.join(missing))
+                    )
+                tenants = list(self.schema_names)
+            elif self.schema_name and self.schema_name != self.PUBLIC_SCHEMA_NAME:
+                if not schema_exists(self.schema_name, using=database):
                     raise MigrationSchemaMissing(
                         'Schema "{}" does not exist'.format(self.schema_name)
                     )
                 else:
                     tenants = [self.schema_name]
             else:
-                tenants = (
-                    get_tenant_model()
-                    .objects.exclude(schema_name=get_public_schema_name())
-                    .values_list("schema_name", flat=True)
+                TenantModel = get_tenant_model()
+                queryset = TenantModel.objects.exclude(
+                    schema_name=get_public_schema_name()
                 )
-            executor.run_migrations(tenants=tenants)
+                if issubclass(TenantModel, MultiDatabaseTenantMixin):
+                    queryset = queryset.filter(database=database)
+                if self.options.get("lazy"):
+                    queryset = self.active_tenants(TenantModel, queryset)
+                tenants = list(queryset.values_list("schema_name", flat=True))
+
+                # the template schema and the pool only live in the default
+                # database
+                if database == DEFAULT_DB_ALIAS:
+                    # keep the template schema migrated along with the tenants
+                    template_schema_name = get_template_schema_name()
+                    if template_schema_name:
+                        if not schema_exists(template_schema_name):
+                            connections[database].cursor().execute(
+                                "CREATE SCHEMA %s" % template_schema_name
+                            )
+                        tenants.append(template_schema_name)
+
+                    # spare schemas of the pool have to be ready to be claimed
+                    tenants.extend(spare_schemas())
+
+            if self.shard is not None:
+                index, count = self.shard
+                tenants = [
+                    schema_name for schema_name in tenants
+                    if schema_shard(schema_name, count) == index
+                ]
+
+            if self.options.get("estimate"):
+                self.estimate(tenants, database)
+                return
+
+            # whether the schemas end up with every migration applied
+            to_head = not (
+                self.options.get("app_label") or self.options.get("migration_name")
+            )
+            selected = list(tenants)
+
+            if (self.options.get("skip_up_to_date") and
+                    not self.options.get("app_label") and
+                    not self.options.get("migration_name")):
+                tenants = self.skip_up_to_date(tenants, database)
+
+            skipped = 0
+            if executor.journal is not None:
+                if self.options.get("resume"):
+                    completed = executor.journal.completed()
+                    skipped = len([name for name in tenants if name in completed])
+                    tenants = [name for name in tenants if name not in completed]
+                else:
+                    executor.journal.reset()
+
+            if self.options.get("order"):
+                tenants = self.order_by_size(tenants, database)
+
+            progress = None
+            if self.options.get("progress"):
+                progress = MigrationProgress(len(tenants), self.stdout)
+                schema_migrated.connect(progress, sender=executor.__class__)
+            try:
+                executor.run_migrations(tenants=tenants)
+            finally:
+                if progress is not None:
+                    schema_migrated.disconnect(progress, sender=executor.__class__)
+                if self.options.get("report"):
+                    write_report(executor.results, self.options["report"])
+
+            if to_head and issubclass(get_tenant_model(), LazyMigrationTenantMixin):
+                # the schemas that were skipped are up to date as well
+                migrated = set(tenants)
+                done = {
+                    result["schema_name"] for result in executor.results
+                    if result["status"] == DONE
+                }
+                get_tenant_model().objects.filter(schema_name__in=[
+                    schema_name for schema_name in selected
+                    if schema_name not in migrated or schema_name in done
+                ]).update(migration_state=get_migration_head())
+
+            self.report(executor, tenants, skipped)
+
+    def active_tenants(self, TenantModel, queryset):
+        """
+        Filters the queryset down to the tenants migrate_schemas --lazy
+        migrates.
+        """
+        if not issubclass(TenantModel, LazyMigrationTenantMixin):
+            raise CommandError(
+                "--lazy requires a tenant model inheriting LazyMigrationTenantMixin."
+            )
+        cutoff = timezone.now() - timedelta(days=get_lazy_migration_active_days())
+        active = queryset.filter(last_seen__gte=cutoff)
+        self._notice(
+            "%d dormant tenant schemas will be migrated on their first request"
+            % queryset.exclude(last_seen__gte=cutoff).count()
+        )
+        return active
+
+    def estimate(self, tenants, database):
+        """
+        Prints the estimate of every tenant schema with pending migrations,
+        longest first, and the total.
+        """
+        estimates = estimate_migrations(tenants, using=database)
+        for schema_name, estimate in sorted(
+            estimates.items(), key=lambda item: item[1]["seconds"], reverse=True
+        ):
+            self.stdout.write(
+                "%s: %d migrations, %d table rewrites, %d index builds, %d table scans, "
+                "%d metadata changes, %d unknown, ~%.1fs, longest lock ~%.1fs"
+                % (
+                    schema_name,
+                    estimate["migrations"],
+                    estimate[REWRITE],
+                    estimate[INDEX],
+                    estimate[SCAN],
+                    estimate[METADATA],
+                    estimate[UNKNOWN],
+                    estimate["seconds"],
+                    estimate["lock_seconds"],
+                )
+            )
+
+        self.stdout.write(
+            "%d of %d tenant schemas have pending migrations, ~%.1fs in total, "
+            "longest lock ~%.1fs"
+            % (
+                len(estimates),
+                len(tenants),
+                sum(estimate["seconds"] for estimate in estimates.values()),
+                max([0] + [estimate["lock_seconds"] for estimate in estimates.values()]),
+            )
+        )
+        if any(estimate[UNKNOWN] for estimate in estimates.values()):
+            self.stdout.write(
+                "The RunSQL and RunPython operations aren't part of the estimate."
+            )
+
+    def order_by_size(self, tenants, database):
+        """
+        Sorts the schemas by the size of their tables, in the order of the
+        order option.
+        """
+        if self.options["order"] not in (LARGEST_FIRST, SMALLEST_FIRST):
+            raise CommandError("Unknown order %s." % self.options["order"])
+        sizes = schema_sizes(tenants, using=database)
+        return sorted(
+            tenants,
+            key=sizes.get,
+            reverse=self.options["order"] == LARGEST_FIRST,
+        )
+
+    def report(self, executor, tenants, skipped):
+        """
+        Prints how many tenant schemas were migrated, failed or skipped,
+        then raises if any failed.
+        """
+        tenants = set(tenants)
+        results = [
+            result for result in executor.results if result["schema_name"] in tenants
+        ]
+        failed = [result for result in results if result["status"] == FAILED]
+        done = len([result for result in results if result["status"] == DONE])
+        self._notice(
+            "%d tenant schemas migrated, %d failed, %d skipped"
+            % (done, len(failed), skipped)
+        )
+        for result in failed:
+            self.stderr.write("%s: %s" % (result["schema_name"], result["error"]))
+        if failed:
+            raise CommandError("%d tenant schemas failed to migrate." % len(failed))
+
+    def skip_up_to_date(self, tenants, database):
+        """
+        Returns the schemas with pending migrations. When they are all in
+        the same app, the migration is restricted to it.
+        """
+        pending = plan_migrations(tenants, using=database)
+        self._notice(
+            "%d of %d tenant schemas have pending migrations"
+            % (len(pending), len(tenants))
+        )
+
+        affected_apps = {
+            app_label for keys in pending.values() for app_label, name in keys
+        }
+        if len(affected_apps) == 1:
+            self.options["app_label"] = affected_apps.pop()
+
+        return [schema_name for schema_name in tenants if schema_name in pending]
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from tenant_schemas.models import MultiDatabaseTenantMixin
+from tenant_schemas.transfer import move_tenant
+from tenant_schemas.utils import get_tenant_model
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the schema of a tenant to another database, streaming its "
+        "tables with COPY. The tenant is read-only during the final catch-up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("database", help="Alias of the target database.")
+        parser.add_argument("-s", "--schema", dest="schema_name", required=True)
+        parser.add_argument(
+            "--lock-timeout",
+            type=int,
+            default=None,
+            help=(
+                "Milliseconds to wait for the locks of the catch-up "
+                "(defaults to TENANT_MOVE_LOCK_TIMEOUT)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        TenantModel = get_tenant_model()
+        if not issubclass(TenantModel, MultiDatabaseTenantMixin):
+            raise CommandError(
+                "%s doesn't inherit MultiDatabaseTenantMixin." % TenantModel.__name__
+            )
+        if options["database"] not in settings.DATABASES:
+            raise CommandError("Unknown database %s." % options["database"])
+
+        connection.set_schema_to_public()
+        try:
+            tenant = TenantModel.objects.get(schema_name=options["schema_name"])
+        except TenantModel.DoesNotExist:
+            raise CommandError("No tenant with schema %s." % options["schema_name"])
+
+        verbosity = int(options["verbosity"])
+        source = tenant.database
+        try:
+            move_tenant(
+                tenant,
+                options["database"],
+                lock_timeout=options["lock_timeout"],
+                verbosity=max(verbosity - 1, 0),
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        if verbosity >= 1:
+            self.stdout.write(
+                "Moved %s from %s to %s."
+                % (tenant.schema_name, source, options["database"])
+            )
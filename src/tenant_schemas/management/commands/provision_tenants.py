@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from tenant_schemas.models import DeferredSchemaTenantMixin
+from tenant_schemas.utils import get_tenant_model
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates and migrates the schemas of tenants that are still being "
+        "provisioned, for example after the worker running it was stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            default=False,
+            help="Also provision the tenants whose provisioning failed.",
+        )
+
+    def handle(self, *args, **options):
+        TenantModel = get_tenant_model()
+        if not issubclass(TenantModel, DeferredSchemaTenantMixin):
+            raise CommandError(
+                "%s doesn't inherit DeferredSchemaTenantMixin." % TenantModel.__name__
+            )
+
+        states = [TenantModel.PROVISIONING]
+        if options["retry_failed"]:
+            states.append(TenantModel.FAILED)
+
+        connection.set_schema_to_public()
+        verbosity = int(options["verbosity"])
+        failed = []
+        for tenant in TenantModel.objects.filter(provisioning_state__in=states):
+            if verbosity >= 1:
+                self.stdout.write(
+                    self.style.NOTICE("=== Provisioning schema ")
+                    + self.style.SQL_TABLE(tenant.schema_name)
+                )
+            try:
+                tenant.provision_schema_now(verbosity=max(verbosity - 1, 0))
+            except Exception as e:
+                self.stderr.write("Provisioning %s failed: %s" % (tenant.schema_name, e))
+                failed.append(tenant.schema_name)
+
+        if failed:
+            raise CommandError("Provisioning failed for %s." % ", ".join(failed))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+from tenant_schemas.pool import get_pool_size, refill_schema_pool
+
+
+class Command(BaseCommand):
+    help = "Creates migrated spare schemas until the pool of spare schemas is full."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=None,
+            help="Number of spare schemas to keep (defaults to TENANT_SCHEMA_POOL_SIZE).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=None,
+            help="Keep running and refill the pool every INTERVAL seconds.",
+        )
+
+    def handle(self, *args, **options):
+        size = options["size"]
+        if size is None:
+            size = get_pool_size()
+        verbosity = int(options["verbosity"])
+
+        while True:
+            created = refill_schema_pool(size=size, verbosity=max(verbosity - 1, 0))
+            if verbosity >= 1:
+                if created is None:
+                    self.stdout.write(self.style.NOTICE("Pool is already being refilled."))
+                else:
+                    self.stdout.write("Created %d spare schemas." % created)
+
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -1,7 +1,8 @@
 from django.conf import settings
 from django.core.exceptions import DisallowedHost
 from django.db import connection
-from django.http import Http404
+from django.http import Http404, HttpResponse
+from tenant_schemas.models import LazyMigrationTenantMixin
 from tenant_schemas.utils import (
     get_public_schema_name,
     get_tenant_model,
@@ -21,6 +22,7 @@ such as inspecting the header, or extracting it from some OAuth token.
 
 class BaseTenantMiddleware:
     TENANT_NOT_FOUND_EXCEPTION = Http404
+    TENANT_NOT_READY_RETRY_AFTER = 5
 
     """
     Subclass and override  this to achieve desired behaviour. Given a
@@ -54,6 +56,18 @@ class BaseTenantMiddleware:
             )
 
         request.tenant = tenant
+
+        # The schema of the tenant may still be provisioned in the background.
+        if not tenant.is_ready:
+            return self.tenant_not_ready_response(request)
+
+        if isinstance(tenant, LazyMigrationTenantMixin):
+            tenant.mark_seen()
+        if not tenant.is_migrated:
+            response = self.migrate_stale_tenant(request)
+            if response is not None:
+                return response
+
         connection.set_tenant(request.tenant)
 
         # Do we have a public-specific urlconf?
@@ -69,6 +83,26 @@ class BaseTenantMiddleware:
     def get_tenant(self, model, hostname, request):
         raise NotImplementedError
 
+    def tenant_not_ready_response(self, request):
+        """
+        Returned while the schema of request.tenant isn't ready to be used.
+        """
+        response = HttpResponse("Tenant is being provisioned.", status=503)
+        response["Retry-After"] = str(self.TENANT_NOT_READY_RETRY_AFTER)
+        return response
+
+    def migrate_stale_tenant(self, request):
+        """
+        Called when the schema of request.tenant was left behind by
+        migrate_schemas --lazy. Migrates it before handling the request, or
+        in a background thread with TENANT_LAZY_MIGRATION_IN_BACKGROUND, in
+        which case the returned response is sent meanwhile.
+        """
+        if getattr(settings, "TENANT_LAZY_MIGRATION_IN_BACKGROUND", False):
+            request.tenant.migrate_schema_in_background()
+            return self.tenant_not_ready_response(request)
+        request.tenant.migrate_schema_now()
+
     def hostname_from_request(self, request):
         """ Extracts hostname from request. Used for custom requests filtering.
             By default removes the request's port and common prefixes.
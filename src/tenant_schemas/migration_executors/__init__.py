@@ -2,7 +2,9 @@ import os
 
 from tenant_schemas.migration_executors.base import MigrationExecutor
 from tenant_schemas.migration_executors.parallel import ParallelExecutor
+from tenant_schemas.migration_executors.replay import ReplayExecutor
 from tenant_schemas.migration_executors.standard import StandardExecutor
+from tenant_schemas.migration_executors.threaded import ThreadedExecutor
 
 
 def get_executor(codename=None):
@@ -1,15 +1,57 @@
 import sys
+import time
+from datetime import datetime, timezone
 
+from django.conf import settings
 from django.core.management.commands.migrate import Command as MigrateCommand
-from django.db import transaction
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
 
-from tenant_schemas.utils import get_public_schema_name
+from tenant_schemas.signals import schema_migrated
+from tenant_schemas.utils import get_app_sets, get_public_schema_name, is_lock_timeout
 
+# Statuses of the schemas in the results of the executors.
+DONE = 'done'
+FAILED = 'failed'
+# The schema hit the lock timeout and will be migrated again.
+LOCKED = 'locked'
 
-def run_migrations(args, options, executor_codename, schema_name, allow_atomic=True):
+
+def get_lock_timeout(options):
+    """
+    Returns the lock_timeout in milliseconds of the migrations, or None to
+    wait for the locks indefinitely.
+    """
+    if options.get('lock_timeout') is not None:
+        return options['lock_timeout']
+    return getattr(settings, 'TENANT_MIGRATION_LOCK_TIMEOUT', None)
+
+
+def get_lock_retries():
+    return getattr(settings, 'TENANT_MIGRATION_LOCK_RETRIES', 5)
+
+
+def get_lock_backoff():
+    return getattr(settings, 'TENANT_MIGRATION_LOCK_BACKOFF', 1)
+
+
+def set_migrated_schema(connection, schema_name, app_set=None):
+    """
+    Points the connection to the schema to migrate. The app set of its
+    tenant, if any, is set on the connection's tenant so that the router
+    only migrates the apps of the app set.
+    """
+    connection.set_schema(schema_name)
+    if app_set:
+        connection.tenant.app_set = app_set
+
+
+def run_migrations(args, options, executor_codename, schema_name, allow_atomic=True,
+                   close_connection=True, app_set=None):
+    """
+    Runs migrate in the schema and returns the number of migrations applied.
+    """
     from django.core.management import color
     from django.core.management.base import OutputWrapper
-    from django.db import connection
 
     style = color.color_style()
 
@@ -27,13 +69,36 @@ def run_migrations(args, options, executor_codename, schema_name, allow_atomic=T
     if int(options.get('verbosity', 1)) >= 1:
         stdout.write(style.NOTICE("=== Running migrate for schema %s" % schema_name))
 
-    connection.set_schema(schema_name)
-    MigrateCommand(stdout=stdout, stderr=stderr).execute(*args, **options)
+    database = options.get('database') or DEFAULT_DB_ALIAS
+    connection = connections[database]
+    set_migrated_schema(connection, schema_name, app_set)
+    lock_timeout = get_lock_timeout(options)
+    if lock_timeout:
+        connection.cursor().execute("SELECT set_config('lock_timeout', %s, false)",
+                                    ('%dms' % lock_timeout, ))
 
+    command = MigrateCommand(stdout=stdout, stderr=stderr)
+    applied = []
+    progress_callback = command.migration_progress_callback
+
+    def migration_progress_callback(action, migration=None, fake=False):
+        if action == 'apply_success':
+            applied.append(migration)
+        progress_callback(action, migration, fake)
+
+    command.migration_progress_callback = migration_progress_callback
     try:
-        transaction.commit()
-        connection.close()
-        connection.connection = None
+        command.execute(*args, **options)
+    finally:
+        # The rollback of a failed transaction resets it.
+        if lock_timeout and not connection.needs_rollback:
+            connection.cursor().execute('RESET lock_timeout')
+
+    try:
+        transaction.commit(using=database)
+        if close_connection:
+            connection.close()
+            connection.connection = None
     except transaction.TransactionManagementError:
         if not allow_atomic:
             raise
@@ -42,23 +107,113 @@ def run_migrations(args, options, executor_codename, schema_name, allow_atomic=T
         pass
 
     connection.set_schema_to_public()
+    return len(applied)
+
+
+def capture_result(options, schema_name, migrate, *args, retry_lock_timeout=False, **kwargs):
+    """
+    Calls migrate(*args, **kwargs) to migrate the schema and returns the
+    result of the schema, with when it started and finished, how long it
+    took in seconds and how many migrations were applied. With
+    the continue_on_error option, an error is reported in the result
+    instead of being raised. With retry_lock_timeout, a lock timeout is
+    reported with the LOCKED status.
+    """
+    result = {
+        'schema_name': schema_name,
+        'status': DONE,
+        'error': None,
+        'started': datetime.now(timezone.utc).isoformat(),
+        'finished': None,
+        'duration': None,
+        'applied': 0,
+    }
+    start = time.monotonic()
+    try:
+        result['applied'] = migrate(*args, **kwargs) or 0
+    except Exception as e:
+        locked = retry_lock_timeout and is_lock_timeout(e)
+        if not locked and not options.get('continue_on_error'):
+            raise
+
+        result['status'] = LOCKED if locked else FAILED
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+        connection = connections[options.get('database') or DEFAULT_DB_ALIAS]
+        if not connection.in_atomic_block:
+            # Start over with a clean connection for the next schema.
+            connection.close()
+        connection.set_schema_to_public()
+    finally:
+        result['finished'] = datetime.now(timezone.utc).isoformat()
+        result['duration'] = round(time.monotonic() - start, 3)
+    return result
+
+
+def migrate_schema(args, options, executor_codename, schema_name, **kwargs):
+    """
+    Runs run_migrations for the schema and returns its result.
+    """
+    return capture_result(options, schema_name, run_migrations,
+                          args, options, executor_codename, schema_name, **kwargs)
 
 
 class MigrationExecutor(object):
     codename = None
 
-    def __init__(self, args, options):
+    def __init__(self, args, options, journal=None):
         self.args = args
         self.options = options
+        self.journal = journal
+        self.results = []
+        # Whether the current round of run_tenant_migrations reports lock
+        # timeouts instead of raising them, and the schemas that hit one.
+        self.retry_lock_timeout = False
+        self.locked = []
+        # The app sets of the tenants, read once per run.
+        self.app_sets = {}
 
     def run_migrations(self, tenants):
         public_schema_name = get_public_schema_name()
+        self.app_sets = get_app_sets(tenants)
 
         if public_schema_name in tenants:
             run_migrations(self.args, self.options, self.codename, public_schema_name)
             tenants.pop(tenants.index(public_schema_name))
 
-        self.run_tenant_migrations(tenants)
+        # The schemas that hit the lock timeout are migrated again in later
+        # rounds, after the others, waiting longer before each round.
+        retries = get_lock_retries()
+        for attempt in range(retries + 1):
+            self.retry_lock_timeout = attempt < retries
+            self.locked = []
+            self.run_tenant_migrations(tenants)
+            if not self.locked:
+                break
+            tenants = self.locked
+            time.sleep(get_lock_backoff() * 2 ** attempt)
 
     def run_tenant_migrations(self, tenant):
         raise NotImplementedError
+
+    def migrate_schema(self, schema_name, **kwargs):
+        """
+        Migrates the schema in this process and records its result.
+        """
+        result = migrate_schema(self.args, self.options, self.codename, schema_name,
+                                retry_lock_timeout=self.retry_lock_timeout,
+                                app_set=self.app_sets.get(schema_name), **kwargs)
+        self.schema_migrated(result)
+        return result
+
+    def schema_migrated(self, result):
+        """
+        Called in the process running migrate_schemas with the result of
+        every tenant schema.
+        """
+        if result['status'] == LOCKED:
+            self.locked.append(result['schema_name'])
+            return
+        self.results.append(result)
+        if self.journal is not None:
+            self.journal.record(result)
+        schema_migrated.send(sender=self.__class__, result=result)
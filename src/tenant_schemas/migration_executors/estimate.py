@@ -0,0 +1,204 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.migrations import executor as migrations_executor
+from django.db.migrations.operations import (
+    AddConstraint,
+    AddField,
+    AddIndex,
+    AlterField,
+    AlterUniqueTogether,
+    RunPython,
+    RunSQL,
+    SeparateDatabaseAndState,
+)
+
+from tenant_schemas.migration_executors.planning import plan_migrations
+from tenant_schemas.utils import app_labels
+
+# Kinds of database operations.
+REWRITE = 'rewrite'
+INDEX = 'index'
+SCAN = 'scan'
+METADATA = 'metadata'
+UNKNOWN = 'unknown'
+
+TABLE_SIZES_SQL = """
+SELECT n.nspname, c.relname, pg_relation_size(c.oid), pg_total_relation_size(c.oid)
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = ANY(%s) AND c.relname = ANY(%s) AND c.relkind IN ('r', 'm')
+"""
+
+
+def get_rewrite_rate():
+    return getattr(settings, 'TENANT_MIGRATION_ESTIMATE_REWRITE_RATE', 50 * 1024 * 1024)
+
+
+def get_index_rate():
+    return getattr(settings, 'TENANT_MIGRATION_ESTIMATE_INDEX_RATE', 100 * 1024 * 1024)
+
+
+def _field_type(field):
+    # Unbound related fields can't render their type, which is the one of
+    # the target field.
+    if field.is_relation:
+        return (field.remote_field.model, field.to_fields)
+    return field.db_parameters(connection)['type']
+
+
+def _field_index(field):
+    if field.unique:
+        return 'unique'
+    if field.db_index:
+        return 'index'
+    return None
+
+
+def classify_operation(operation, old_field=None):
+    """
+    Returns what PostgreSQL does to the table for the operation: rewrite it,
+    build an index or validate a constraint, scan it to check a new NOT
+    NULL, only change the catalog, or something that can't be known in
+    advance. An AlterField is classified from the change to old_field, or
+    as a rewrite when it isn't given.
+    """
+    if isinstance(operation, (RunSQL, RunPython)):
+        return UNKNOWN
+    if isinstance(operation, AlterField):
+        field = operation.field
+        if old_field is None or _field_type(old_field) != _field_type(field):
+            return REWRITE
+        if _field_index(field) and _field_index(field) != _field_index(old_field):
+            return INDEX
+        if old_field.null and not field.null:
+            return SCAN
+        return METADATA
+    if isinstance(operation, AddField):
+        field = operation.field
+        if field.unique or field.db_index or field.is_relation:
+            return INDEX
+        return METADATA
+    if isinstance(operation, (AddIndex, AddConstraint, AlterUniqueTogether)):
+        return INDEX
+    return METADATA
+
+
+def _old_field(state, app_label, operation):
+    if not isinstance(operation, AlterField):
+        return None
+    model_state = state.models.get((app_label, operation.model_name_lower))
+    if model_state is None:
+        return None
+    return model_state.fields.get(operation.name)
+
+
+def _database_operations(operation):
+    if isinstance(operation, SeparateDatabaseAndState):
+        for database_operation in operation.database_operations:
+            yield from _database_operations(database_operation)
+    else:
+        yield operation
+
+
+def _db_table(state, app_label, operation):
+    model_name = getattr(operation, 'model_name', None) or getattr(operation, 'name', None)
+    if not isinstance(model_name, str):
+        return None
+    model_state = state.models.get((app_label, model_name.lower()))
+    if model_state is None:
+        return None
+    return model_state.options.get('db_table') or '%s_%s' % (app_label, model_name.lower())
+
+
+def migration_operations(loader, key):
+    """
+    Returns the table and kind of every database operation of the migration.
+    """
+    migration = loader.graph.nodes[key]
+    state = loader.project_state(key, at_end=False)
+    operations = []
+    for operation in migration.operations:
+        for database_operation in _database_operations(operation):
+            operations.append((
+                _db_table(state, migration.app_label, database_operation),
+                classify_operation(database_operation,
+                                   _old_field(state, migration.app_label, database_operation)),
+            ))
+        operation.state_forwards(migration.app_label, state)
+    return operations
+
+
+def table_sizes(schema_names, table_names, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the size in bytes of the heap and the total size, with indexes
+    and TOAST, of the tables, keyed by (schema name, table name). The
+    schema names are compared in lower case, like in schema_sizes.
+    """
+    schema_names, table_names = list(schema_names), list(table_names)
+    if not schema_names or not table_names:
+        return {}
+
+    cursor = connections[using].cursor()
+    cursor.execute(TABLE_SIZES_SQL, (
+        [schema_name.lower() for schema_name in schema_names], table_names))
+    sizes = {(schema_name, table): (int(size), int(total_size))
+             for schema_name, table, size, total_size in cursor.fetchall()}
+    cursor.close()
+    return {(schema_name, table): sizes[(schema_name.lower(), table)]
+            for schema_name in schema_names for table in table_names
+            if (schema_name.lower(), table) in sizes}
+
+
+def operation_seconds(kind, sizes):
+    size, total_size = sizes
+    if kind == REWRITE:
+        return total_size / get_rewrite_rate()
+    if kind in (INDEX, SCAN):
+        return size / get_index_rate()
+    return 0
+
+
+def estimate_migrations(schema_names, using=DEFAULT_DB_ALIAS):
+    """
+    Estimates the pending migrations of the tenant schemas without applying
+    them. Returns a dict keyed by the name of the schemas with pending
+    migrations, with their number of migrations, number of operations of
+    each kind, estimated duration and longest estimated lock in seconds.
+
+    The operations are classified once per migration and the sizes of the
+    tables they touch read with a single query. A migration holds its locks
+    until it commits, so the longest lock is the one of the longest atomic
+    migration.
+    """
+    pending = plan_migrations(schema_names, using=using)
+    loader = migrations_executor.MigrationLoader(None)
+    tenant_apps = set(app_labels(settings.TENANT_APPS))
+
+    operations = {}
+    for keys in pending.values():
+        for key in keys:
+            if key not in operations:
+                # The migrations of the shared apps are only recorded.
+                operations[key] = (migration_operations(loader, key)
+                                   if key[0] in tenant_apps else [])
+    sizes = table_sizes(pending, {table for key_operations in operations.values()
+                                  for table, kind in key_operations if table}, using=using)
+
+    estimates = {}
+    for schema_name, keys in pending.items():
+        estimate = {'migrations': len(keys), REWRITE: 0, INDEX: 0, SCAN: 0, METADATA: 0,
+                    UNKNOWN: 0,
+                    'seconds': 0, 'lock_seconds': 0}
+        for key in keys:
+            seconds = []
+            for table, kind in operations[key]:
+                estimate[kind] += 1
+                seconds.append(operation_seconds(kind, sizes.get((schema_name, table), (0, 0))))
+            estimate['seconds'] += sum(seconds)
+            if loader.graph.nodes[key].atomic:
+                estimate['lock_seconds'] = max(estimate['lock_seconds'], sum(seconds))
+            else:
+                estimate['lock_seconds'] = max([estimate['lock_seconds']] + seconds)
+        estimates[schema_name] = estimate
+
+    return estimates
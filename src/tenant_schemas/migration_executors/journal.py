@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from tenant_schemas.migration_executors.base import DONE
+from tenant_schemas.utils import get_public_schema_name
+
+# Value of --journal storing the journal in a table of the public schema.
+DATABASE_JOURNAL = 'db'
+
+JOURNAL_TABLE = 'tenant_schemas_migration_journal'
+
+
+class FileJournal(object):
+    """
+    Journal of the schemas migrated by a migrate_schemas run, written as
+    JSON lines to a file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            open(self.path, 'w').close()
+
+    def record(self, result):
+        with self.lock, open(self.path, 'a') as f:
+            f.write(json.dumps(result, default=str) + '\n')
+
+    def completed(self):
+        """
+        Returns the schemas whose last recorded migration succeeded.
+        """
+        if not os.path.exists(self.path):
+            return set()
+
+        statuses = {}
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    result = json.loads(line)
+                    statuses[result['schema_name']] = result['status']
+        return {schema_name for schema_name, status in statuses.items() if status == DONE}
+
+
+class DatabaseJournal(object):
+    """
+    Journal of the schemas migrated by a migrate_schemas run, stored in a
+    table of the public schema.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.table = '%s.%s' % (get_public_schema_name(), JOURNAL_TABLE)
+        self.lock = threading.Lock()
+        self.table_created = False
+
+    def _cursor(self):
+        cursor = connections[self.using].cursor()
+        # The table is created on first use only.
+        with self.lock:
+            if not self.table_created:
+                cursor.execute('CREATE TABLE IF NOT EXISTS %s (schema_name varchar(63) '
+                               'PRIMARY KEY, status varchar(16) NOT NULL, error text, '
+                               'recorded_at timestamp with time zone NOT NULL DEFAULT now())'
+                               % self.table)
+                self.table_created = True
+        return cursor
+
+    def reset(self):
+        self._cursor().execute('DELETE FROM %s' % self.table)
+
+    def record(self, result):
+        self._cursor().execute(
+            'INSERT INTO %s (schema_name, status, error) VALUES (%%s, %%s, %%s) '
+            'ON CONFLICT (schema_name) DO UPDATE SET status = EXCLUDED.status, '
+            'error = EXCLUDED.error, recorded_at = now()' % self.table,
+            (result['schema_name'], result['status'], result['error']))
+
+    def completed(self):
+        cursor = self._cursor()
+        cursor.execute('SELECT schema_name FROM %s WHERE status = %%s' % self.table, (DONE, ))
+        return {row[0] for row in cursor.fetchall()}
+
+
+def get_journal(value, using=DEFAULT_DB_ALIAS):
+    if value == DATABASE_JOURNAL:
+        return DatabaseJournal(using=using)
+    return FileJournal(value)
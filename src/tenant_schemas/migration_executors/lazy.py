@@ -0,0 +1,74 @@
+import hashlib
+
+from django.conf import settings
+from django.core.management.commands.migrate import Command as MigrateCommand
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+
+from tenant_schemas.migration_executors.base import run_migrations
+from tenant_schemas.utils import ADVISORY_LOCK_ID, app_labels
+
+# Prefix of the output of the migrations run on the first request.
+LAZY_CODENAME = 'lazy'
+
+_migration_head = None
+
+
+def get_migration_head():
+    """
+    Returns a hash of the latest migrations of the tenant apps. A schema
+    migrated when the hash was the same is up to date. The migration files
+    don't change while the process runs, so it is computed once.
+    """
+    global _migration_head
+    if _migration_head is None:
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        tenant_apps = set(app_labels(settings.TENANT_APPS))
+        leaves = sorted('%s.%s' % key for key in loader.graph.leaf_nodes()
+                        if key[0] in tenant_apps)
+        _migration_head = hashlib.sha1('\n'.join(leaves).encode()).hexdigest()
+    return _migration_head
+
+
+def get_lazy_migration_active_days():
+    return getattr(settings, 'TENANT_LAZY_MIGRATION_ACTIVE_DAYS', 7)
+
+
+def migrate_lazily(tenant, verbosity=0, wait=True):
+    """
+    Migrates the schema of the tenant if its migration_state isn't the
+    current head, then stores the head. Concurrent calls for the same tenant
+    are serialized with an advisory lock, so the schema is migrated once.
+    Without wait, returns false instead of waiting for the lock.
+    """
+    head = get_migration_head()
+    model = type(tenant)
+
+    connection.set_schema_to_public()
+    cursor = connection.cursor()
+    if wait:
+        cursor.execute('SELECT pg_advisory_lock(%s, hashtext(%s))',
+                       (ADVISORY_LOCK_ID, tenant.schema_name))
+    else:
+        cursor.execute('SELECT pg_try_advisory_lock(%s, hashtext(%s))',
+                       (ADVISORY_LOCK_ID, tenant.schema_name))
+        if not cursor.fetchone()[0]:
+            return False
+
+    try:
+        # it may have been migrated while waiting for the lock
+        tenant.migration_state = model.objects.filter(pk=tenant.pk).values_list(
+            'migration_state', flat=True).get()
+        if tenant.migration_state != head:
+            options = vars(MigrateCommand().create_parser('manage.py', 'migrate').parse_args([]))
+            options.update(interactive=False, verbosity=verbosity, skip_checks=True)
+            # The connection keeps the advisory lock, so it can't be closed.
+            run_migrations([], options, LAZY_CODENAME, tenant.schema_name,
+                           close_connection=False, app_set=getattr(tenant, 'app_set', None))
+            model.objects.filter(pk=tenant.pk).update(migration_state=head)
+            tenant.migration_state = head
+    finally:
+        connection.set_schema_to_public()
+        connection.cursor().execute('SELECT pg_advisory_unlock(%s, hashtext(%s))',
+                                    (ADVISORY_LOCK_ID, tenant.schema_name))
+    return True
@@ -0,0 +1,103 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.migrations import executor as migrations_executor
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+
+
+class CachedMigrationLoader(MigrationLoader):
+    """
+    Migration loader that reads the migration files once per process and
+    builds the migration graph once per state of the squashed migrations,
+    instead of once per schema. Only the applied migrations are read from
+    each schema.
+    """
+
+    _disk_cache = {}
+    _graph_cache = {}
+
+    def load_disk(self):
+        key = self.ignore_no_migrations
+        if key not in self._disk_cache:
+            super().load_disk()
+            self._disk_cache[key] = (self.disk_migrations, self.unmigrated_apps,
+                                     self.migrated_apps)
+
+        disk_migrations, unmigrated_apps, migrated_apps = self._disk_cache[key]
+        self.disk_migrations = dict(disk_migrations)
+        self.unmigrated_apps = set(unmigrated_apps)
+        self.migrated_apps = set(migrated_apps)
+
+    def build_graph(self):
+        if self.connection is None:
+            return super().build_graph()
+
+        self.load_disk()
+        applied_migrations = MigrationRecorder(self.connection).applied_migrations()
+
+        # The graph only depends on the schema through the applied status of
+        # the squashed migrations.
+        replacements = {key: migration for key, migration in self.disk_migrations.items()
+                        if migration.replaces}
+        key = (self.ignore_no_migrations, self.replace_migrations, frozenset(
+            target for migration in replacements.values() for target in migration.replaces
+            if target in applied_migrations))
+
+        if key not in self._graph_cache:
+            super().build_graph()
+            self._graph_cache[key] = self.graph
+            return
+
+        self.graph = self._graph_cache[key]
+        self.replacements = replacements
+        self.applied_migrations = applied_migrations
+        if self.replace_migrations:
+            # Mark the replacing migrations as applied like build_graph does.
+            for replacing_key, migration in replacements.items():
+                if all(target in applied_migrations for target in migration.replaces):
+                    applied_migrations[replacing_key] = migration
+                else:
+                    applied_migrations.pop(replacing_key, None)
+
+    @classmethod
+    def clear_cache(cls):
+        cls._disk_cache.clear()
+        cls._graph_cache.clear()
+
+
+# Runs using CachedMigrationLoader, which may overlap when migrations run
+# in background threads. The loader is patched by the first one and
+# restored, with the cache cleared, by the last one.
+_patch_lock = threading.Lock()
+_patch_users = 0
+_previous_loader = None
+
+
+@contextmanager
+def cached_migration_loader():
+    """
+    Makes the migration executors use CachedMigrationLoader, with a fresh
+    cache, for the duration of the block. Overlapping blocks, from nested
+    calls or other threads, share the loader and its cache.
+    """
+    global _patch_users, _previous_loader
+
+    with _patch_lock:
+        if not _patch_users:
+            CachedMigrationLoader.clear_cache()
+            _previous_loader = migrations_executor.MigrationLoader
+            migrations_executor.MigrationLoader = CachedMigrationLoader
+        _patch_users += 1
+    try:
+        # Read the migration files before the parallel executor forks, so
+        # its workers inherit them.
+        CachedMigrationLoader(None, load=False).load_disk()
+        yield
+    finally:
+        with _patch_lock:
+            _patch_users -= 1
+            if not _patch_users:
+                migrations_executor.MigrationLoader = _previous_loader
+                _previous_loader = None
+                CachedMigrationLoader.clear_cache()
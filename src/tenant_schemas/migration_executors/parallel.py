@@ -1,9 +1,37 @@
 import functools
 import multiprocessing
+from multiprocessing.util import Finalize
 
+import django
+from django.apps import apps
 from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
 
-from tenant_schemas.migration_executors.base import MigrationExecutor, run_migrations
+from tenant_schemas.migration_executors.base import MigrationExecutor, migrate_schema
+
+
+def _get_context():
+    # The platform default unless set, forked workers inherit the loaded
+    # project instead of setting it up again.
+    return multiprocessing.get_context(
+        getattr(settings, 'TENANT_PARALLEL_MIGRATION_START_METHOD', None))
+
+
+def _init_worker(database):
+    if not apps.ready:
+        django.setup()
+    # A forked worker inherits the connections opened by the parent since
+    # the pool started, they must not be used nor closed by the worker.
+    for conn in connections.all():
+        conn.connection = None
+    # The connection is reused across the schemas migrated by the worker
+    # and closed when the worker exits.
+    Finalize(None, connections[database].close, exitpriority=10)
+
+
+def _migrate_schema(app_sets, args, options, executor_codename, schema_name, **kwargs):
+    return migrate_schema(args, options, executor_codename, schema_name,
+                          app_set=app_sets.get(schema_name), **kwargs)
 
 
 class ParallelExecutor(MigrationExecutor):
@@ -13,18 +41,35 @@ class ParallelExecutor(MigrationExecutor):
         if tenants:
             processes = getattr(settings, 'TENANT_PARALLEL_MIGRATION_MAX_PROCESSES', 2)
             chunks = getattr(settings, 'TENANT_PARALLEL_MIGRATION_CHUNKS', 2)
+            max_tasks = getattr(settings, 'TENANT_PARALLEL_MIGRATION_MAX_TASKS_PER_CHILD', 100)
+            database = self.options.get('database') or DEFAULT_DB_ALIAS
 
-            from django.db import connection
-
+            # Workers must not share the connection of the parent.
+            connection = connections[database]
             connection.close()
             connection.connection = None
 
-            run_migrations_p = functools.partial(
-                run_migrations,
+            migrate_schema_p = functools.partial(
+                _migrate_schema,
+                self.app_sets,
                 self.args,
                 self.options,
                 self.codename,
-                allow_atomic=False
+                retry_lock_timeout=self.retry_lock_timeout,
+                allow_atomic=False,
+                close_connection=False,
             )
-            p = multiprocessing.Pool(processes=processes)
-            p.map(run_migrations_p, tenants, chunks)
+            pool = _get_context().Pool(processes=processes,
+                                       initializer=_init_worker,
+                                       initargs=(database, ),
+                                       maxtasksperchild=max_tasks)
+            try:
+                for result in pool.imap_unordered(migrate_schema_p, tenants, chunks):
+                    self.schema_migrated(result)
+            except BaseException:
+                pool.terminate()
+                raise
+            else:
+                pool.close()
+            finally:
+                pool.join()
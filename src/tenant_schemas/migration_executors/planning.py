@@ -0,0 +1,67 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations import executor as migrations_executor
+
+from tenant_schemas.postgresql_backend.base import _check_schema_name
+
+# Number of schemas whose django_migrations tables are read in one query.
+PLAN_BATCH_SIZE = 1000
+
+MIGRATIONS_TABLES_SQL = """
+SELECT n.nspname
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relname = 'django_migrations' AND c.relkind IN ('r', 'p') AND n.nspname = ANY(%s)
+"""
+
+
+def applied_migrations(schema_names, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the applied migrations of every schema, as a dict of sets of
+    (app_label, name) keyed by schema name. The django_migrations tables
+    are read PLAN_BATCH_SIZE schemas at a time with UNION ALL queries.
+    """
+    schema_names = list(schema_names)
+    for schema_name in schema_names:
+        _check_schema_name(schema_name)
+    applied = {schema_name: set() for schema_name in schema_names}
+
+    cursor = connections[using].cursor()
+    cursor.execute(MIGRATIONS_TABLES_SQL, ([schema_name.lower() for schema_name in schema_names], ))
+    migrated = {row[0] for row in cursor.fetchall()}
+    migrated = [schema_name for schema_name in schema_names if schema_name.lower() in migrated]
+
+    for i in range(0, len(migrated), PLAN_BATCH_SIZE):
+        batch = migrated[i:i + PLAN_BATCH_SIZE]
+        cursor.execute(' UNION ALL '.join(
+            'SELECT %%s, app, name FROM %s.django_migrations' % schema_name
+            for schema_name in batch), batch)
+        for schema_name, app_label, name in cursor.fetchall():
+            applied[schema_name].add((app_label, name))
+    cursor.close()
+
+    return applied
+
+
+def plan_migrations(schema_names, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the pending migrations of every schema that has some, as a dict
+    of sets of (app_label, name) keyed by schema name. Schemas missing from
+    the dict are up to date.
+    """
+    # Uses the loader of the migration executors, which is cached during a
+    # migrate_schemas run.
+    loader = migrations_executor.MigrationLoader(None)
+    pending = {}
+    for schema_name, applied in applied_migrations(schema_names, using=using).items():
+        missing = set()
+        for key in loader.graph.nodes:
+            if key in applied:
+                continue
+            migration = loader.replacements.get(key)
+            if migration and all(target in applied for target in migration.replaces):
+                continue
+            missing.add(key)
+        if missing:
+            pending[schema_name] = missing
+
+    return pending
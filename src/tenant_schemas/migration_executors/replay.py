@@ -0,0 +1,234 @@
+import sys
+
+from django.apps import apps
+from django.core.management import color
+from django.core.management.base import OutputWrapper
+from django.core.management.sql import emit_post_migrate_signal, emit_pre_migrate_signal
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations import executor as migrations_executor
+from django.db.migrations.operations import RunPython, SeparateDatabaseAndState
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.migrations.state import ModelState
+
+from tenant_schemas.migration_executors.base import (
+    DONE,
+    MigrationExecutor,
+    capture_result,
+    get_lock_timeout,
+    run_migrations,
+    set_migrated_schema,
+)
+from tenant_schemas.migration_executors.planning import plan_migrations
+
+# migrate options the replay can't honour, the standard path is used instead.
+UNSUPPORTED_OPTIONS = ('migration_name', 'fake', 'fake_initial', 'plan', 'check_unapplied',
+                       'prune', 'run_syncdb')
+
+
+def _runs_python(operations):
+    for operation in operations:
+        if isinstance(operation, RunPython):
+            return True
+        if (isinstance(operation, SeparateDatabaseAndState) and
+                _runs_python(operation.database_operations)):
+            return True
+    return False
+
+
+def is_replayable(plan):
+    """
+    Whether the plan only applies atomic migrations without Python code,
+    so that its SQL is the same for every schema.
+    """
+    return all(not backwards and migration.atomic and not _runs_python(migration.operations)
+               for migration, backwards in plan)
+
+
+class _SchemaEditorStatements(object):
+    """
+    Execute wrapper keeping the statements the schema editor runs, while
+    active is set by RecordingSchemaEditor.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.active = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.active:
+            self.statements.append((sql, params, many))
+        return execute(sql, params, many, context)
+
+
+def _recording_schema_editor_class(schema_editor_class, recorder):
+    class RecordingSchemaEditor(schema_editor_class):
+        def execute(self, sql, params=()):
+            recorder.active = True
+            try:
+                return super().execute(sql, params)
+            finally:
+                recorder.active = False
+
+    return RecordingSchemaEditor
+
+
+def _post_migrate_apps(state):
+    # Like migrate, re-renders the models of the real apps to include their
+    # relationships.
+    state.clear_delayed_apps_cache()
+    post_migrate_apps = state.apps
+    with post_migrate_apps.bulk_update():
+        model_keys = []
+        for model_state in post_migrate_apps.real_models:
+            model_key = model_state.app_label, model_state.name_lower
+            model_keys.append(model_key)
+            post_migrate_apps.unregister_model(*model_key)
+    post_migrate_apps.render_multiple(
+        [ModelState.from_model(apps.get_model(*model)) for model in model_keys])
+    return post_migrate_apps
+
+
+def _up_to_date():
+    return 0
+
+
+class ReplayExecutor(MigrationExecutor):
+    """
+    Migrates the first schema needing the pending migrations the standard
+    way, keeping the SQL its schema editor runs, and replays that SQL in
+    the other schemas with the same pending migrations, recording them in
+    django_migrations. Plans running Python code are migrated the standard
+    way.
+    """
+    codename = 'replay'
+
+    def run_tenant_migrations(self, tenants):
+        database = self.options.get('database') or DEFAULT_DB_ALIAS
+        if any(self.options.get(option) for option in UNSUPPORTED_OPTIONS):
+            for schema_name in tenants:
+                self.migrate_schema(schema_name)
+            return
+
+        pending = plan_migrations(tenants, using=database)
+        groups = {}
+        for schema_name in tenants:
+            if schema_name not in pending:
+                self.schema_migrated(capture_result(self.options, schema_name, _up_to_date))
+                continue
+            # The SQL of the migrations depends on the app set of the tenant.
+            groups.setdefault((frozenset(pending[schema_name]), self.app_sets.get(schema_name)),
+                              []).append(schema_name)
+
+        for schema_names in groups.values():
+            self.replay(schema_names, database)
+
+    def get_plan(self, executor):
+        targets = executor.loader.graph.leaf_nodes()
+        app_label = self.options.get('app_label')
+        if app_label:
+            targets = [key for key in targets if key[0] == app_label]
+        return executor.migration_plan(targets)
+
+    def replay(self, schema_names, database):
+        connection = connections[database]
+        set_migrated_schema(connection, schema_names[0], self.app_sets.get(schema_names[0]))
+        executor = migrations_executor.MigrationExecutor(connection)
+        plan = self.get_plan(executor)
+        if not plan:
+            connection.set_schema_to_public()
+            for schema_name in schema_names:
+                self.schema_migrated(capture_result(self.options, schema_name, _up_to_date))
+            return
+
+        if not is_replayable(plan):
+            connection.set_schema_to_public()
+            for schema_name in schema_names:
+                self.migrate_schema(schema_name)
+            return
+
+        # The states migrate gives to the pre_migrate and post_migrate
+        # receivers, the same for every schema of the group.
+        pre_migrate_state = executor._create_project_state(with_applied_migrations=True)
+        post_migrate_state = pre_migrate_state.clone()
+        for migration, backwards in plan:
+            post_migrate_state = migration.mutate_state(post_migrate_state, preserve=False)
+        pre_migrate_apps = pre_migrate_state.apps
+        post_migrate_apps = _post_migrate_apps(post_migrate_state)
+        connection.set_schema_to_public()
+
+        # The SQL is taken from a schema migrated the standard way, so the
+        # statements that depend on what the schema editor introspects are
+        # the ones actually run.
+        schema_names = list(schema_names)
+        while schema_names:
+            recorder = _SchemaEditorStatements()
+            result = capture_result(
+                self.options, schema_names[0], self.migrate_reference,
+                schema_names[0], database, recorder,
+                retry_lock_timeout=self.retry_lock_timeout)
+            self.schema_migrated(result)
+            schema_names.pop(0)
+            if result['status'] == DONE:
+                break
+
+        for schema_name in schema_names:
+            self.schema_migrated(capture_result(
+                self.options, schema_name, self.replay_schema,
+                schema_name, database, plan, recorder.statements,
+                pre_migrate_apps, post_migrate_apps,
+                retry_lock_timeout=self.retry_lock_timeout))
+
+    def migrate_reference(self, schema_name, database, recorder):
+        """
+        Migrates the schema the standard way, keeping the statements run by
+        the schema editor in the recorder.
+        """
+        connection = connections[database]
+        schema_editor_class = connection.SchemaEditorClass
+        connection.SchemaEditorClass = _recording_schema_editor_class(
+            schema_editor_class, recorder)
+        try:
+            with connection.execute_wrapper(recorder):
+                return run_migrations(self.args, self.options, self.codename, schema_name,
+                                      app_set=self.app_sets.get(schema_name))
+        finally:
+            del connection.SchemaEditorClass
+
+    def replay_schema(self, schema_name, database, plan, statements, pre_migrate_apps,
+                      post_migrate_apps):
+        verbosity = int(self.options.get('verbosity', 1))
+        interactive = self.options.get('interactive', False)
+        style = color.color_style()
+        stdout = OutputWrapper(sys.stdout)
+        if verbosity >= 1:
+            stdout.write(style.NOTICE('[%s:%s] === Replaying %d migrations' % (
+                self.codename, schema_name, len(plan))))
+
+        connection = connections[database]
+        set_migrated_schema(connection, schema_name, self.app_sets.get(schema_name))
+        emit_pre_migrate_signal(verbosity, interactive, database, apps=pre_migrate_apps,
+                                plan=plan)
+        lock_timeout = get_lock_timeout(self.options)
+        with transaction.atomic(using=database):
+            cursor = connection.cursor()
+            if lock_timeout:
+                cursor.execute("SELECT set_config('lock_timeout', %s, true)",
+                               ('%dms' % lock_timeout, ))
+            for sql, params, many in statements:
+                if many:
+                    cursor.executemany(sql, params)
+                else:
+                    cursor.execute(sql, params)
+            recorder = MigrationRecorder(connection)
+            recorder.ensure_schema()
+            # For replacement migrations, the replaced ones are recorded.
+            recorder.migration_qs.bulk_create([
+                recorder.Migration(app=app_label, name=name)
+                for migration, backwards in plan
+                for app_label, name in (migration.replaces or
+                                        [(migration.app_label, migration.name)])
+            ])
+        emit_post_migrate_signal(verbosity, interactive, database, apps=post_migrate_apps,
+                                 plan=plan)
+        connection.set_schema_to_public()
+        return len(plan)
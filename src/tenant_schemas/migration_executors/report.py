@@ -0,0 +1,64 @@
+import csv
+import json
+import threading
+import time
+from datetime import timedelta
+
+# Columns of the report files.
+REPORT_FIELDS = ('schema_name', 'status', 'started', 'finished', 'duration', 'applied', 'error')
+
+PROGRESS_BAR_WIDTH = 30
+
+
+class MigrationProgress(object):
+    """
+    Prints how many of the tenant schemas are migrated and when the run is
+    expected to end to the OutputWrapper of a command. Connected to the
+    schema_migrated signal, which the threaded executor sends from its
+    workers.
+    """
+
+    def __init__(self, total, stream):
+        self.total = total
+        self.stream = stream
+        self.migrated = 0
+        self.start = time.monotonic()
+        self.live = stream.isatty()
+        self.lock = threading.Lock()
+
+    def eta(self):
+        elapsed = time.monotonic() - self.start
+        remaining = elapsed / self.migrated * (self.total - self.migrated)
+        return timedelta(seconds=round(remaining))
+
+    def __call__(self, sender, result, **kwargs):
+        with self.lock:
+            self.migrated += 1
+            if self.live:
+                filled = PROGRESS_BAR_WIDTH * self.migrated // max(self.total, 1)
+                self.stream.write('\r[%s%s] %d/%d ETA %s' % (
+                    '#' * filled, '.' * (PROGRESS_BAR_WIDTH - filled),
+                    self.migrated, self.total, self.eta()), ending='')
+                if self.migrated == self.total:
+                    self.stream.write('')
+            else:
+                self.stream.write('[%d/%d] %s %s in %.1fs, %d migrations applied, ETA %s' % (
+                    self.migrated, self.total, result['schema_name'], result['status'],
+                    result['duration'], result['applied'], self.eta()))
+            self.stream.flush()
+
+
+def write_report(results, path):
+    """
+    Writes the results of the tenant schemas to path, slowest first, as CSV
+    if the file name ends with .csv and as JSON otherwise.
+    """
+    results = sorted(results, key=lambda result: result['duration'] or 0, reverse=True)
+    with open(path, 'w', newline='') as f:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(results)
+        else:
+            json.dump([{field: result.get(field) for field in REPORT_FIELDS}
+                       for result in results], f, indent=2)
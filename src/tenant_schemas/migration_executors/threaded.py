@@ -0,0 +1,84 @@
+import queue
+import threading
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from tenant_schemas.migration_executors.base import MigrationExecutor
+
+
+class _ThreadLocalDict(MutableMapping):
+    """
+    Dict whose content is private to each thread.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def _data(self):
+        if not hasattr(self._local, 'data'):
+            self._local.data = {}
+        return self._local.data
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ThreadedExecutor(MigrationExecutor):
+    """
+    Migrates the tenant schemas from a pool of threads sharing the loaded
+    project and migration graph. Each thread migrates schemas one after the
+    other with its own connection.
+    """
+    codename = 'threaded'
+
+    def run_tenant_migrations(self, tenants):
+        if not tenants:
+            return
+
+        threads = getattr(settings, 'TENANT_THREADED_MIGRATION_MAX_THREADS', 4)
+        database = self.options.get('database') or DEFAULT_DB_ALIAS
+        schemas = queue.SimpleQueue()
+        for schema_name in tenants:
+            schemas.put(schema_name)
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        schema_name = schemas.get_nowait()
+                    except queue.Empty:
+                        return
+                    self.migrate_schema(schema_name, allow_atomic=False,
+                                        close_connection=False)
+            finally:
+                connections[database].close()
+
+        # The content types cached while migrating a schema, for instance
+        # by the post_migrate handler of auth, must not be seen by the
+        # threads migrating other schemas.
+        content_types_cache = ContentType.objects._cache
+        ContentType.objects._cache = _ThreadLocalDict()
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                futures = [executor.submit(worker) for _ in range(min(threads, len(tenants)))]
+                for future in futures:
+                    future.result()
+        finally:
+            ContentType.objects._cache = content_types_cache
@@ -1,31 +1,165 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.apps import apps
 from django.core.management import call_command
-from django.db import connection, models
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.utils import timezone
 
+from tenant_schemas import workers
+from tenant_schemas.clone import clone_schema, copy_schema_data, create_template_schema
+from tenant_schemas.drop import DELETED_PREFIX, drop_schema_incrementally
+from tenant_schemas.migration_executors.lazy import (
+    get_lazy_migration_active_days,
+    get_migration_head,
+    migrate_lazily,
+)
+from tenant_schemas.pool import claim_spare_schema, get_pool_size
 from tenant_schemas.postgresql_backend.base import _check_schema_name
 from tenant_schemas.signals import post_schema_sync
-from tenant_schemas.utils import get_public_schema_name, schema_exists
+from tenant_schemas.utils import (
+    app_labels,
+    get_app_set_apps,
+    get_public_schema_name,
+    get_template_schema_name,
+    get_tenant_apps,
+    schema_exists,
+    schemas_exist,
+)
 
 
 class TenantQueryset(models.QuerySet):
     """
     QuerySet for instances that inherit from the TenantMixin.
     """
-    def delete(self):
+    def delete(self, force_drop=False, batch_size=10, concurrency=1, progress=None):
         """
-        Make sure we call the delete method of each object in the queryset so
-        that safety checks and schema deletion (if requested) are executed
-        even when using bulk delete.
+        Deletes the tenants of the queryset and drops their schemas if the
+        model has auto_drop_schema set or force_drop is true.
+
+        The existence of the schemas is checked with a single query and they
+        are dropped batch_size at a time, using concurrency connections in
+        parallel. A batch locks every object of its schemas until it
+        commits, so it is kept small. progress, if given, is called with the number of dropped
+        schemas and the total after each batch. The rows are then deleted
+        with a single query.
+
+        If the model overrides delete() or drops schemas incrementally,
+        delete() is called for each object instead.
         """
-        counter, counter_dict = 0, {}
-        for obj in self:
-            result = obj.delete()
-            if result is not None:
-                current_counter, current_counter_dict = result
-                counter += current_counter
-                counter_dict.update(current_counter_dict)
+        if (self.model.delete is not TenantMixin.delete or
+                self.model.drop_schema_incrementally or self.model.drop_schema_in_background):
+            counter, counter_dict = 0, {}
+            kwargs = {'force_drop': True} if force_drop else {}
+            for obj in self:
+                result = obj.delete(**kwargs)
+                if result is not None:
+                    current_counter, current_counter_dict = result
+                    counter += current_counter
+                    counter_dict.update(current_counter_dict)
+            if counter:
+                return counter, counter_dict
+            return None
+
+        tenants = list(self.values_list('pk', 'schema_name'))
+        public_schema_name = get_public_schema_name()
+        for pk, schema_name in tenants:
+            if connection.schema_name not in (schema_name, public_schema_name):
+                raise Exception("Can't delete tenant outside it's own schema or "
+                                "the public schema. Current schema is %s."
+                                % connection.schema_name)
+
+        if tenants and (self.model.auto_drop_schema or force_drop):
+            existing = schemas_exist(schema_name for pk, schema_name in tenants)
+            schema_names = [schema_name for pk, schema_name in tenants
+                            if schema_name in existing]
+            _drop_schemas(schema_names, batch_size, concurrency, progress)
+
+        counter, counter_dict = models.QuerySet.delete(
+            self.model.objects.filter(pk__in=[pk for pk, schema_name in tenants]))
         if counter:
             return counter, counter_dict
 
+    def bulk_create_tenants(self, tenants, batch_size=None, schema_batch_size=500,
+                            drop_batch_size=10, executor=None, verbosity=1):
+        """
+        Creates many tenants at once. The rows are inserted with a bulk
+        insert, the missing schemas are created with one statement per
+        batch of schema_batch_size schemas and all of them are migrated
+        in a single migrate_schemas run using the given executor, the
+        configured one by default, or cloned from TENANT_TEMPLATE_SCHEMA if
+        it is set. Inside a transaction, the schemas are migrated by the
+        standard executor, as the other ones use other connections that
+        can't see the uncommitted schemas.
+        post_schema_sync is sent for each tenant once everything is done.
+        If anything fails, the schemas are dropped drop_batch_size at a
+        time and the rows deleted.
+        """
+        if connection.schema_name != get_public_schema_name():
+            raise Exception("Can't create tenant outside the public schema. "
+                            "Current schema is %s." % connection.schema_name)
+
+        for tenant in tenants:
+            _check_schema_name(tenant.schema_name)
+
+        tenants = self.bulk_create(tenants, batch_size=batch_size)
+        if not self.model.auto_create_schema:
+            return tenants
+
+        cursor = connection.cursor()
+        existing = schemas_exist(tenant.schema_name for tenant in tenants)
+        schema_names = [tenant.schema_name for tenant in tenants
+                        if tenant.schema_name not in existing]
+
+        template_schema_name = get_template_schema_name()
+        try:
+            if template_schema_name:
+                create_template_schema(verbosity=verbosity)
+                for schema_name in schema_names:
+                    clone_schema(template_schema_name, schema_name)
+            else:
+                for i in range(0, len(schema_names), schema_batch_size):
+                    cursor.execute('; '.join('CREATE SCHEMA %s' % schema_name for schema_name
+                                             in schema_names[i:i + schema_batch_size]))
+
+            if schema_names and not template_schema_name:
+                if connection.in_atomic_block:
+                    executor = 'standard'
+                call_command('migrate_schemas',
+                             schema_names=schema_names,
+                             executor=executor,
+                             interactive=False,
+                             verbosity=verbosity)
+        except:
+            # We failed creating the tenants, delete what we created and
+            # re-raise the exception
+            connection.set_schema_to_public()
+            cursor = connection.cursor()
+            for i in range(0, len(schema_names), drop_batch_size):
+                cursor.execute('DROP SCHEMA IF EXISTS %s CASCADE'
+                               % ', '.join(schema_names[i:i + drop_batch_size]))
+            models.QuerySet.delete(self.model.objects.filter(
+                pk__in=[tenant.pk for tenant in tenants]))
+            raise
+
+        connection.set_schema_to_public()
+        if issubclass(self.model, LazyMigrationTenantMixin):
+            # like save, new schemas are fully migrated
+            head = get_migration_head()
+            created = [tenant for tenant in tenants if tenant.schema_name in schema_names]
+            self.model.objects.filter(pk__in=[tenant.pk for tenant in created]).update(
+                migration_state=head)
+            for tenant in created:
+                tenant.migration_state = head
+
+        for tenant in tenants:
+            post_schema_sync.send(sender=TenantMixin, tenant=tenant)
+
+        return tenants
+
 
 class TenantMixin(models.Model):
     """
@@ -45,6 +179,27 @@ class TenantMixin(models.Model):
     to be automatically created upon save.
     """
 
+    drop_schema_incrementally = False
+    """
+    Set this flag to true on a parent class to drop the tables of the schema
+    a few at a time, in separate transactions, instead of dropping the whole
+    schema at once. This avoids taking a lock on every object of a large
+    schema in a single transaction.
+    """
+
+    drop_schema_in_background = False
+    """
+    Set this flag to true on a parent class to rename the schema when the
+    tenant is deleted and drop it incrementally in a background thread.
+    """
+
+    app_set = None
+    """
+    Name of the app set of TENANT_APP_SETS whose tables are created in the
+    schema of this tenant, all the TENANT_APPS if empty. Override it with a
+    field, or a property deriving it from the plan of the tenant.
+    """
+
     domain_url = models.CharField(max_length=128, unique=True)
     schema_name = models.CharField(max_length=63, unique=True,
                                    validators=[_check_schema_name])
@@ -67,15 +222,36 @@ class TenantMixin(models.Model):
         super().save(*args, **kwargs)
 
         if is_new and self.auto_create_schema:
-            try:
-                self.create_schema(check_if_exists=True, verbosity=verbosity)
-            except:
-                # We failed creating the tenant, delete what we created and
-                # re-raise the exception
-                self.delete(force_drop=True)
-                raise
-            else:
-                post_schema_sync.send(sender=TenantMixin, tenant=self)
+            self.provision_schema(verbosity=verbosity)
+
+    @property
+    def is_ready(self):
+        """
+        Whether the schema of this tenant can be used.
+        """
+        return True
+
+    @property
+    def is_migrated(self):
+        """
+        Whether the schema of this tenant has every migration applied.
+        """
+        return True
+
+    def provision_schema(self, verbosity=1):
+        """
+        Creates and syncs the schema of a newly saved tenant and sends
+        post_schema_sync. The tenant is deleted if that fails.
+        """
+        try:
+            self.create_schema(check_if_exists=True, verbosity=verbosity)
+        except:
+            # We failed creating the tenant, delete what we created and
+            # re-raise the exception
+            self.delete(force_drop=True)
+            raise
+        else:
+            post_schema_sync.send(sender=TenantMixin, tenant=self)
 
     def delete(self, force_drop=False, *args, **kwargs):
         """
@@ -89,16 +265,119 @@ class TenantMixin(models.Model):
 
         if schema_exists(self.schema_name) and (self.auto_drop_schema or force_drop):
             cursor = connection.cursor()
-            cursor.execute('DROP SCHEMA IF EXISTS %s CASCADE' % self.schema_name)
+            if self.drop_schema_in_background:
+                # Delete the row, then move the schema out of the way in the
+                # same transaction, so the schema name can be reused right
+                # away, and drop it once both are committed.
+                with transaction.atomic():
+                    result = super().delete(*args, **kwargs)
+                    deleted_schema_name = DELETED_PREFIX + uuid.uuid4().hex[:16]
+                    cursor.execute('ALTER SCHEMA %s RENAME TO %s'
+                                   % (self.schema_name, deleted_schema_name))
+                    transaction.on_commit(
+                        lambda: workers.submit(drop_schema_incrementally, deleted_schema_name))
+                return result
+            elif self.drop_schema_incrementally:
+                if connection.in_atomic_block:
+                    # Tables can only be dropped a few at a time outside of
+                    # a transaction.
+                    schema_name = self.schema_name
+                    transaction.on_commit(lambda: drop_schema_incrementally(schema_name))
+                else:
+                    drop_schema_incrementally(self.schema_name)
+            else:
+                cursor.execute('DROP SCHEMA IF EXISTS %s CASCADE' % self.schema_name)
 
         return super().delete(*args, **kwargs)
 
+    def clone_from(self, source_tenant):
+        """
+        Replaces the data of this tenant with a copy of the data of
+        source_tenant. Every table of the tenant apps is copied with a
+        server-side INSERT ... SELECT, so no row goes through Python. Both
+        tenants must have the same app set.
+        """
+        if connection.schema_name not in (self.schema_name, get_public_schema_name()):
+            raise Exception("Can't clone tenant outside it's own schema or "
+                            "the public schema. Current schema is %s."
+                            % connection.schema_name)
+
+        tenant_apps = get_tenant_apps(self)
+        if set(app_labels(tenant_apps)) != set(app_labels(get_tenant_apps(source_tenant))):
+            raise Exception("Can't clone tenant %s, its app set isn't the same as the "
+                            "one of %s." % (source_tenant.schema_name, self.schema_name))
+
+        copy_schema_data(source_tenant.schema_name, self.schema_name, tenant_apps)
+
+    def change_app_set(self, app_set, verbosity=1):
+        """
+        Saves the new app set of the tenant and creates the tables of the
+        apps it adds, in one transaction. The tables of the apps it removes
+        are kept, so an app removed earlier can't be added back: its
+        migrations were recorded without being applied to its tables.
+        """
+        added = (set(app_labels(get_app_set_apps(app_set))) -
+                 set(app_labels(get_tenant_apps(self))))
+        tables = {model._meta.db_table: model._meta.app_label
+                  for app_label in added
+                  for model in apps.get_app_config(app_label).get_models()
+                  if model._meta.managed and not model._meta.proxy}
+        cursor = connection.cursor()
+        cursor.execute('SELECT tablename FROM pg_catalog.pg_tables '
+                       'WHERE schemaname = %s AND tablename = ANY(%s)',
+                       (self.schema_name, list(tables)))
+        kept = sorted({tables[row[0]] for row in cursor.fetchall()})
+        if kept:
+            raise Exception("Can't add back the apps %s, their tables are still in "
+                            "schema %s." % (', '.join(kept), self.schema_name))
+
+        # The migrations of the added apps are unrecorded below, which
+        # would leave the recorded migrations of the other apps depending
+        # on them inconsistent.
+        graph = MigrationLoader(None, ignore_no_migrations=True).graph
+        cursor.execute('SELECT app, name FROM %s.django_migrations' % self.schema_name)
+        dependent = sorted({
+            '%s.%s' % key for key in cursor.fetchall()
+            if key[0] not in added and key in graph.node_map and
+            any(parent.key[0] in added for parent in graph.node_map[key].parents)
+        })
+        if dependent:
+            raise Exception("Can't add the apps %s, the migrations %s applied in schema %s "
+                            "depend on them." % (', '.join(sorted(added)),
+                                                 ', '.join(dependent), self.schema_name))
+
+        previous_app_set = self.app_set
+        self.app_set = app_set
+        try:
+            # migrate_schemas reads the app set of the saved tenant.
+            with transaction.atomic():
+                self.save()
+                # The migrations of the apps left out were recorded without
+                # being applied, they have to run again.
+                cursor = connection.cursor()
+                cursor.execute('DELETE FROM %s.django_migrations WHERE app = ANY(%%s)'
+                               % self.schema_name, (sorted(added), ))
+                call_command('migrate_schemas',
+                             schema_name=self.schema_name,
+                             interactive=False,
+                             verbosity=verbosity)
+        except:
+            self.app_set = previous_app_set
+            raise
+        finally:
+            connection.set_schema_to_public()
+
     def create_schema(self, check_if_exists=False, sync_schema=True,
                       verbosity=1):
         """
         Creates the schema 'schema_name' for this tenant. Optionally checks if
         the schema already exists before creating it. Returns true if the
         schema was created, false otherwise.
+
+        If TENANT_SCHEMA_POOL_SIZE is set, a ready spare schema is claimed
+        from the pool. Otherwise, if TENANT_TEMPLATE_SCHEMA is set, the schema
+        is synced by cloning the template schema instead of running every
+        migration.
         """
 
         # safety check
@@ -108,6 +387,19 @@ class TenantMixin(models.Model):
         if check_if_exists and schema_exists(self.schema_name):
             return False
 
+        # spare and template schemas have the tables of every tenant app
+        if (sync_schema and not self.app_set and get_pool_size() and
+                claim_spare_schema(self.schema_name)):
+            connection.set_schema_to_public()
+            return True
+
+        template_schema_name = get_template_schema_name()
+        if sync_schema and template_schema_name and not self.app_set:
+            create_template_schema(verbosity=verbosity)
+            clone_schema(template_schema_name, self.schema_name)
+            connection.set_schema_to_public()
+            return True
+
         # create the schema
         cursor.execute('CREATE SCHEMA %s' % self.schema_name)
 
@@ -118,3 +410,239 @@ class TenantMixin(models.Model):
                          verbosity=verbosity)
 
         connection.set_schema_to_public()
+        return True
+
+
+class DeferredSchemaTenantMixin(TenantMixin):
+    """
+    Tenant whose schema is created and migrated by a background worker
+    instead of during save(). Until that is done, provisioning_state is
+    PROVISIONING and the middlewares answer 503 for the tenant.
+    """
+
+    PROVISIONING = 'provisioning'
+    READY = 'ready'
+    FAILED = 'failed'
+    PROVISIONING_STATES = (
+        (PROVISIONING, 'Provisioning'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    )
+
+    provisioning_state = models.CharField(max_length=16, choices=PROVISIONING_STATES,
+                                          default=READY)
+
+    class Meta:
+        abstract = True
+
+    def save(self, verbosity=1, *args, **kwargs):
+        if self.pk is None and self.auto_create_schema:
+            self.provisioning_state = self.PROVISIONING
+        super().save(verbosity, *args, **kwargs)
+
+    @property
+    def is_ready(self):
+        return self.provisioning_state == self.READY
+
+    def provision_schema(self, verbosity=1):
+        """
+        Schedules the creation of the schema once the tenant row is
+        committed, so the worker can see it.
+        """
+        model, pk = type(self), self.pk
+        transaction.on_commit(
+            lambda: workers.submit(_provision_deferred_schema, model, pk, verbosity))
+
+    def provision_schema_now(self, verbosity=1):
+        """
+        Creates and syncs the schema, then marks the tenant as ready and
+        sends post_schema_sync. The tenant is marked as failed if that fails.
+        A schema left by a failed attempt is migrated again.
+        """
+        model = type(self)
+        try:
+            if not self.create_schema(check_if_exists=True, verbosity=verbosity):
+                call_command('migrate_schemas',
+                             schema_name=self.schema_name,
+                             interactive=False,
+                             verbosity=verbosity)
+        except:
+            connection.set_schema_to_public()
+            model.objects.filter(pk=self.pk).update(provisioning_state=self.FAILED)
+            self.provisioning_state = self.FAILED
+            raise
+
+        model.objects.filter(pk=self.pk).update(provisioning_state=self.READY)
+        self.provisioning_state = self.READY
+        post_schema_sync.send(sender=TenantMixin, tenant=self)
+
+
+class MultiDatabaseTenantMixin(TenantMixin):
+    """
+    Tenant whose schema lives in the database alias stored in database.
+    Tenant rows stay in the default database, TenantDatabaseRouter sends
+    the queries on the tenant apps to the tenant's database.
+    """
+
+    database = models.CharField(max_length=100, default=DEFAULT_DB_ALIAS)
+
+    class Meta:
+        abstract = True
+
+    def delete(self, force_drop=False, *args, **kwargs):
+        if self.database == DEFAULT_DB_ALIAS:
+            return super().delete(force_drop, *args, **kwargs)
+
+        if connection.schema_name not in (self.schema_name, get_public_schema_name()):
+            raise Exception("Can't delete tenant outside it's own schema or "
+                            "the public schema. Current schema is %s."
+                            % connection.schema_name)
+
+        if self.auto_drop_schema or force_drop:
+            connections[self.database].cursor().execute(
+                'DROP SCHEMA IF EXISTS %s CASCADE' % self.schema_name)
+
+        return models.Model.delete(self, *args, **kwargs)
+
+    def create_schema(self, check_if_exists=False, sync_schema=True,
+                      verbosity=1):
+        """
+        Creates the schema in the tenant's database. The template schema and
+        the pool of spare schemas are only used in the default database.
+        """
+        if self.database == DEFAULT_DB_ALIAS:
+            return super().create_schema(check_if_exists, sync_schema, verbosity)
+
+        _check_schema_name(self.schema_name)
+        if check_if_exists and schema_exists(self.schema_name, using=self.database):
+            return False
+
+        connections[self.database].cursor().execute('CREATE SCHEMA %s' % self.schema_name)
+        if sync_schema:
+            call_command('migrate_schemas',
+                         schema_name=self.schema_name,
+                         database=self.database,
+                         interactive=False,
+                         verbosity=verbosity)
+        connections[self.database].set_schema_to_public()
+        return True
+
+
+class LazyMigrationTenantMixin(TenantMixin):
+    """
+    Tenant whose schema can be left behind by migrate_schemas --lazy and
+    migrated on its first request instead. migration_state is the migration
+    head its schema was last migrated to, last_seen when it was last
+    requested.
+    """
+
+    migration_state = models.CharField(max_length=40, blank=True, default='')
+    last_seen = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, verbosity=1, *args, **kwargs):
+        if self.pk is None and self.auto_create_schema:
+            # new schemas are fully migrated
+            self.migration_state = get_migration_head()
+        super().save(verbosity, *args, **kwargs)
+
+    @property
+    def is_migrated(self):
+        return self.migration_state == get_migration_head()
+
+    @property
+    def is_active(self):
+        """
+        Whether the tenant was requested in the last
+        TENANT_LAZY_MIGRATION_ACTIVE_DAYS days. migrate_schemas --lazy only
+        migrates the schemas of the active tenants.
+        """
+        return (self.last_seen is not None and self.last_seen >=
+                timezone.now() - timedelta(days=get_lazy_migration_active_days()))
+
+    def mark_seen(self):
+        """
+        Records that the tenant was requested, at most once an hour.
+        """
+        now = timezone.now()
+        if self.last_seen is None or self.last_seen < now - timedelta(hours=1):
+            type(self).objects.filter(pk=self.pk).update(last_seen=now)
+            self.last_seen = now
+
+    def migrate_schema_now(self, verbosity=0, wait=True):
+        """
+        Migrates the schema if it is stale. Returns false if wait is false
+        and the schema is already being migrated.
+        """
+        return migrate_lazily(self, verbosity=verbosity, wait=wait)
+
+    def migrate_schema_in_background(self):
+        """
+        Migrates the schema in a background thread, unless a migration of
+        the schema was already submitted by this process and hasn't ended.
+        Returns the future of the migration, or None.
+        """
+        key = (type(self), self.pk)
+        with _lazy_migrations_lock:
+            if key in _lazy_migrations:
+                return None
+            _lazy_migrations.add(key)
+        try:
+            future = workers.submit(_migrate_lazy_schema, type(self), self.pk)
+        except Exception:
+            _lazy_migrations.discard(key)
+            raise
+        future.add_done_callback(lambda future: _lazy_migrations.discard(key))
+        return future
+
+
+# lazy tenants whose migration is submitted to the background workers
+_lazy_migrations = set()
+_lazy_migrations_lock = threading.Lock()
+
+
+def _provision_deferred_schema(model, pk, verbosity):
+    connection.set_schema_to_public()
+    model.objects.get(pk=pk).provision_schema_now(verbosity=verbosity)
+
+
+def _migrate_lazy_schema(model, pk):
+    connection.set_schema_to_public()
+    model.objects.get(pk=pk).migrate_schema_now(wait=False)
+
+
+def _drop_schema_batch(schema_names, close_connection=False):
+    try:
+        cursor = connection.cursor()
+        cursor.execute('DROP SCHEMA IF EXISTS %s CASCADE' % ', '.join(schema_names))
+    finally:
+        if close_connection:
+            connection.close()
+
+
+def _drop_schemas(schema_names, batch_size, concurrency=1, progress=None):
+    """
+    Drops the schemas batch_size at a time. Batches are dropped from
+    concurrency threads, each with its own connection, unless we are in a
+    transaction which the drops have to be part of.
+    """
+    batches = [schema_names[i:i + batch_size] for i in range(0, len(schema_names), batch_size)]
+    done, total = 0, len(schema_names)
+
+    if concurrency > 1 and not connection.in_atomic_block:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(_drop_schema_batch, batch, close_connection=True): len(batch)
+                       for batch in batches}
+            for future in as_completed(futures):
+                future.result()
+                done += futures[future]
+                if progress:
+                    progress(done, total)
+    else:
+        for batch in batches:
+            _drop_schema_batch(batch)
+            done += len(batch)
+            if progress:
+                progress(done, total)
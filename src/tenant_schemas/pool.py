@@ -0,0 +1,142 @@
+import uuid
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+
+from tenant_schemas import workers
+from tenant_schemas.clone import clone_schema, create_template_schema
+from tenant_schemas.postgresql_backend.base import _check_schema_name
+from tenant_schemas.utils import ADVISORY_LOCK_ID, get_template_schema_name
+
+# Spare schemas are built under this prefix and only renamed to their
+# final name once they are fully migrated.
+BUILDING_PREFIX = 'ts_building_'
+
+# Second key of the advisory lock held while refilling the pool.
+REFILL_LOCK_KEY = 0
+
+
+def get_pool_size():
+    return getattr(settings, 'TENANT_SCHEMA_POOL_SIZE', 0)
+
+
+def get_pool_low_watermark():
+    return getattr(settings, 'TENANT_SCHEMA_POOL_LOW_WATERMARK', get_pool_size() // 2)
+
+
+def get_pool_prefix():
+    return getattr(settings, 'TENANT_SCHEMA_POOL_PREFIX', 'ts_spare_')
+
+
+def _like_prefix(prefix):
+    return prefix.replace('\\', '\\\\').replace('_', '\\_').replace('%', '\\%') + '%'
+
+
+def _schemas_with_prefix(prefix):
+    cursor = connection.cursor()
+    cursor.execute('SELECT nspname FROM pg_catalog.pg_namespace WHERE nspname LIKE %s '
+                   'ORDER BY nspname', (_like_prefix(prefix), ))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def spare_schemas():
+    """
+    Returns the names of the ready spare schemas in the pool.
+    """
+    return _schemas_with_prefix(get_pool_prefix())
+
+
+def claim_spare_schema(schema_name):
+    """
+    Renames a spare schema of the pool to schema_name. Returns true if a
+    spare was claimed, false if the pool is empty.
+
+    Concurrent claims skip the spares locked by each other.
+    """
+    _check_schema_name(schema_name)
+
+    with transaction.atomic():
+        cursor = connection.cursor()
+        for spare in spare_schemas():
+            cursor.execute('SELECT pg_try_advisory_xact_lock(%s, hashtext(%s))',
+                           (ADVISORY_LOCK_ID, spare))
+            if not cursor.fetchone()[0]:
+                continue
+
+            # it may have been claimed by a transaction that committed in
+            # the meantime
+            cursor.execute('SELECT EXISTS(SELECT 1 FROM pg_catalog.pg_namespace '
+                           'WHERE nspname = %s)', (spare, ))
+            if cursor.fetchone()[0]:
+                cursor.execute('ALTER SCHEMA %s RENAME TO %s' % (spare, schema_name))
+                break
+        else:
+            return False
+
+    # The refill must not be part of the transaction creating the tenant,
+    # nor see the claimed spare before it is committed.
+    transaction.on_commit(_refill_below_low_watermark)
+    return True
+
+
+def _refill_below_low_watermark():
+    if len(spare_schemas()) < get_pool_low_watermark():
+        if getattr(settings, 'TENANT_SCHEMA_POOL_REFILL_IN_BACKGROUND', True):
+            workers.submit(refill_schema_pool, verbosity=0)
+        else:
+            refill_schema_pool(verbosity=0)
+
+
+def create_spare_schema(verbosity=1):
+    """
+    Creates a fully migrated spare schema and adds it to the pool.
+    """
+    suffix = uuid.uuid4().hex[:16]
+    building_name = BUILDING_PREFIX + suffix
+    spare_name = get_pool_prefix() + suffix
+    _check_schema_name(spare_name)
+
+    template_schema_name = get_template_schema_name()
+    if template_schema_name:
+        create_template_schema(verbosity=verbosity)
+        clone_schema(template_schema_name, building_name)
+    else:
+        connection.cursor().execute('CREATE SCHEMA %s' % building_name)
+        call_command('migrate_schemas',
+                     schema_name=building_name,
+                     interactive=False,
+                     verbosity=verbosity)
+        connection.set_schema_to_public()
+
+    connection.cursor().execute('ALTER SCHEMA %s RENAME TO %s' % (building_name, spare_name))
+    return spare_name
+
+
+def refill_schema_pool(size=None, verbosity=1):
+    """
+    Tops the pool up to size (TENANT_SCHEMA_POOL_SIZE by default) spare
+    schemas. Returns the number of schemas created, or None if another
+    refill is already running.
+    """
+    if size is None:
+        size = get_pool_size()
+
+    connection.set_schema_to_public()
+    cursor = connection.cursor()
+    cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', (ADVISORY_LOCK_ID, REFILL_LOCK_KEY))
+    if not cursor.fetchone()[0]:
+        return None
+
+    try:
+        # no other refill is running, so these are leftovers of failed ones
+        for schema_name in _schemas_with_prefix(BUILDING_PREFIX):
+            cursor.execute('DROP SCHEMA IF EXISTS %s CASCADE' % schema_name)
+
+        missing = max(size - len(spare_schemas()), 0)
+        for _ in range(missing):
+            create_spare_schema(verbosity=verbosity)
+        return missing
+    finally:
+        cursor = connection.cursor()
+        cursor.execute('SELECT pg_advisory_unlock(%s, %s)', (ADVISORY_LOCK_ID, REFILL_LOCK_KEY))
@@ -7,6 +7,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ImproperlyConfigured, ValidationError
 import django.db.utils
 
+from tenant_schemas.explain import SampledExplainWrapper
 from tenant_schemas.utils import get_public_schema_name, get_limit_set_calls
 from tenant_schemas.postgresql_backend.introspection import DatabaseSchemaIntrospection
 
@@ -68,6 +69,9 @@ class DatabaseWrapper(original_backend.DatabaseWrapper):
         self._ts_last_path_sig = None  # Cache for last applied search path signature
         self.set_schema_to_public()
 
+        if getattr(settings, "TENANT_EXPLAIN_SLOW_QUERIES", False):
+            self.execute_wrappers.append(SampledExplainWrapper())
+
     def close(self):
         self.search_path_set = False
         self._ts_last_path_sig = None  # Clear cache on close
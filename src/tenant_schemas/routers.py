@@ -1,9 +1,9 @@
 from django.conf import settings
-from django.db import connection
+from django.db import DEFAULT_DB_ALIAS, connection, connections
 from django.db.utils import load_backend
 
 from tenant_schemas.postgresql_backend.base import DatabaseWrapper as TenantDbWrapper
-from tenant_schemas.utils import app_labels, get_public_schema_name
+from tenant_schemas.utils import app_labels, get_public_schema_name, get_tenant_apps
 
 
 class TenantSyncRouter(object):
@@ -20,12 +20,43 @@ class TenantSyncRouter(object):
             return None
 
 
-        if connection.schema_name == get_public_schema_name():
+        if connections[db].schema_name == get_public_schema_name():
             if app_label not in app_labels(settings.SHARED_APPS):
                 return False
         else:
-            if app_label not in app_labels(settings.TENANT_APPS):
+            if app_label not in app_labels(get_tenant_apps(connections[db].tenant)):
                 return False
 
         return None
 
+
+
+class TenantDatabaseRouter(object):
+    """
+    Routes the queries on the tenant apps to the database of the current
+    tenant, for tenant models inheriting MultiDatabaseTenantMixin. The
+    connection to that database follows the tenant set on the default
+    connection. Shared apps stay in the default database.
+    """
+
+    def _db_for_model(self, model):
+        app_label = model._meta.app_label
+        if (app_label not in app_labels(settings.TENANT_APPS) or
+                app_label in app_labels(settings.SHARED_APPS)):
+            return None
+
+        tenant = connection.tenant
+        database = getattr(tenant, 'database', DEFAULT_DB_ALIAS)
+        if database == DEFAULT_DB_ALIAS:
+            return None
+
+        tenant_connection = connections[database]
+        if tenant_connection.schema_name != tenant.schema_name:
+            tenant_connection.set_tenant(tenant)
+        return database
+
+    def db_for_read(self, model, **hints):
+        return self._db_for_model(model)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for_model(model)
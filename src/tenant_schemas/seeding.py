@@ -0,0 +1,197 @@
+import io
+import threading
+import uuid
+
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+
+from tenant_schemas.clone import (
+    TABLES_SQL,
+    clone_schema,
+    create_template_schema,
+    get_tenant_apps_models,
+)
+from tenant_schemas.postgresql_backend.base import _check_schema_name
+from tenant_schemas.transfer import copy_from, copy_to
+from tenant_schemas.utils import get_template_schema_name, schema_context
+
+# Fixtures are loaded in a schema with this prefix while they are compiled.
+SCRATCH_PREFIX = 'ts_seed_'
+
+_seeds = {}
+_seeds_lock = threading.Lock()
+
+
+class CompiledSeed(object):
+    """
+    Rows of a set of fixtures, kept as a binary COPY payload per table,
+    that can be loaded into any tenant schema with a few statements.
+    """
+
+    def __init__(self, tables, models):
+        # dicts with the name, columns, primary key column (None for the
+        # many-to-many tables, which are copied without their primary key)
+        # and COPY payload of every table
+        self.tables = tables
+        self.models = models
+
+    def load(self, schema_name):
+        """
+        Loads the rows into the schema in a single transaction. Like
+        loaddata, rows whose primary key already exists are updated, and
+        many-to-many rows already linking the same objects are kept.
+        """
+        _check_schema_name(schema_name)
+        quote_name = connection.ops.quote_name
+
+        with transaction.atomic():
+            cursor = connection.cursor()
+            for table in self.tables:
+                columns = [quote_name(column) for column in table['columns']]
+                name = '%s.%s' % (schema_name, quote_name(table['name']))
+                cursor.execute('CREATE TEMPORARY TABLE ts_seed_rows AS SELECT %s FROM %s '
+                               'WITH NO DATA' % (', '.join(columns), name))
+                copy_from(cursor, 'COPY ts_seed_rows FROM STDIN (FORMAT binary)',
+                          io.BytesIO(table['data']))
+
+                pk = table['pk'] and quote_name(table['pk'])
+                updates = ['%s = EXCLUDED.%s' % (column, column)
+                           for column in columns if column != pk]
+                if pk and updates:
+                    conflict = 'ON CONFLICT (%s) DO UPDATE SET %s' % (pk, ', '.join(updates))
+                else:
+                    conflict = 'ON CONFLICT DO NOTHING'
+                cursor.execute('INSERT INTO %s (%s) SELECT %s FROM ts_seed_rows %s' % (
+                    name, ', '.join(columns), ', '.join(columns), conflict))
+                cursor.execute('DROP TABLE ts_seed_rows')
+
+            # The reset statements use unqualified table names.
+            with schema_context(schema_name):
+                cursor = connection.cursor()
+                for sql in connection.ops.sequence_reset_sql(no_style(), self.models):
+                    cursor.execute(sql)
+
+
+def _copy_rows(cursor, schema_name, db_table, columns, key_column, keys):
+    quote_name = connection.ops.quote_name
+    cursor.execute('DELETE FROM ts_seed_keys')
+    cursor.execute('INSERT INTO ts_seed_keys SELECT unnest(%s::text[])',
+                   ([str(key) for key in keys], ))
+    data = io.BytesIO()
+    copy_to(cursor, 'COPY (SELECT %s FROM %s.%s WHERE %s::text IN (SELECT key FROM ts_seed_keys)) '
+                    'TO STDOUT (FORMAT binary)' % (
+                        ', '.join(quote_name(column) for column in columns), schema_name,
+                        quote_name(db_table), quote_name(key_column)), data)
+    return data.getvalue()
+
+
+def _create_scratch_schema(schema_name, verbosity):
+    """
+    Creates the schema the fixtures are loaded in like the tenant schemas
+    are created, along with the rows of the template schema, such as the
+    content types and permissions, or migrated.
+    """
+    template_schema_name = get_template_schema_name()
+    if template_schema_name:
+        create_template_schema(verbosity=verbosity)
+        clone_schema(template_schema_name, schema_name)
+    else:
+        connection.cursor().execute('CREATE SCHEMA %s' % schema_name)
+        call_command('migrate_schemas',
+                     schema_name=schema_name,
+                     interactive=False,
+                     verbosity=verbosity)
+        connection.set_schema_to_public()
+
+
+def compile_fixtures(fixture_labels, verbosity=0):
+    """
+    Loads the fixtures once with loaddata in a scratch schema and keeps the
+    rows it saved, along with the rows of their parent models and their
+    many-to-many rows, as COPY payloads. The fixtures are loaded in a
+    transaction that is rolled back, then the scratch schema is dropped.
+    """
+    scratch_schema_name = SCRATCH_PREFIX + uuid.uuid4().hex[:16]
+    tenant_models = set(get_tenant_apps_models())
+    saved = {}
+
+    def collect(sender, instance, raw, using, **kwargs):
+        if raw and using == connection.alias:
+            model = sender._meta.concrete_model
+            for saved_model in [model] + model._meta.get_parent_list():
+                saved.setdefault(saved_model, set()).add(instance.pk)
+
+    _create_scratch_schema(scratch_schema_name, verbosity)
+    try:
+        with transaction.atomic():
+            post_save.connect(collect)
+            try:
+                with schema_context(scratch_schema_name):
+                    call_command('loaddata', *fixture_labels, verbosity=verbosity)
+            finally:
+                post_save.disconnect(collect)
+
+            cursor = connection.cursor()
+            cursor.execute(TABLES_SQL, (scratch_schema_name, ))
+            columns = {name: table_columns
+                       for name, table_columns, has_identity in cursor.fetchall()}
+            cursor.execute('CREATE TEMPORARY TABLE ts_seed_keys (key text) ON COMMIT DROP')
+
+            tables, models = [], []
+            for model, pks in saved.items():
+                if model not in tenant_models:
+                    raise ValueError("%s isn't a model of the TENANT_APPS." % model._meta.label)
+                db_table = model._meta.db_table
+                tables.append({
+                    'name': db_table,
+                    'columns': columns[db_table],
+                    'pk': model._meta.pk.column,
+                    'data': _copy_rows(cursor, scratch_schema_name, db_table, columns[db_table],
+                                       model._meta.pk.column, pks),
+                })
+                models.append(model)
+
+                for field in model._meta.local_many_to_many:
+                    through = field.remote_field.through
+                    if not through._meta.auto_created:
+                        continue
+                    # The rows are matched by the objects they link, their
+                    # primary keys may be taken in the seeded schema.
+                    through_columns = [field.m2m_column_name(), field.m2m_reverse_name()]
+                    tables.append({
+                        'name': through._meta.db_table,
+                        'columns': through_columns,
+                        'pk': None,
+                        'data': _copy_rows(cursor, scratch_schema_name, through._meta.db_table,
+                                           through_columns, field.m2m_column_name(), pks),
+                    })
+                    models.append(through)
+
+            transaction.set_rollback(True)
+    finally:
+        connection.set_schema_to_public()
+        connection.cursor().execute('DROP SCHEMA IF EXISTS %s CASCADE' % scratch_schema_name)
+
+    return CompiledSeed(tables, models)
+
+
+def get_seed(fixture_labels):
+    """
+    Returns the compiled seed of the fixtures, compiled on the first call
+    only.
+    """
+    key = tuple(fixture_labels)
+    with _seeds_lock:
+        if key not in _seeds:
+            _seeds[key] = compile_fixtures(fixture_labels)
+        return _seeds[key]
+
+
+def seed_schema(schema_name, fixture_labels):
+    """
+    Loads the fixtures into the schema, from the seed compiled once per
+    process.
+    """
+    get_seed(fixture_labels).load(schema_name)
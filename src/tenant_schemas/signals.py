@@ -4,3 +4,8 @@ post_schema_sync = Signal(['tenant'])
 post_schema_sync.__doc__ = """
 Sent after a tenant has been saved, its schema created and synced
 """
+
+schema_migrated = Signal()
+schema_migrated.__doc__ = """
+Sent by migrate_schemas with the result of every tenant schema once it is migrated
+"""
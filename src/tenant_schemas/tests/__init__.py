@@ -1,6 +1,11 @@
 from .template_loader import *
 from .test_cache import *
+from .test_clone import *
+from .test_explain import *
 from .test_log import *
+from .test_pool import *
 from .test_routes import *
+from .test_seeding import *
 from .test_tenants import *
+from .test_transfer import *
 from .test_utils import *
@@ -1,4 +1,11 @@
-from tenant_schemas.models import TenantMixin
+from django.db import models
+
+from tenant_schemas.models import (
+    DeferredSchemaTenantMixin,
+    LazyMigrationTenantMixin,
+    MultiDatabaseTenantMixin,
+    TenantMixin,
+)
 
 
 # as TenantMixin is an abstract model, it needs to be created
@@ -14,3 +21,25 @@ class NonAutoSyncTenant(TenantMixin):
 
     class Meta:
         app_label = 'tenant_schemas'
+
+
+class DeferredTenant(DeferredSchemaTenantMixin):
+    class Meta:
+        app_label = 'tenant_schemas'
+
+
+class MultiDatabaseTenant(MultiDatabaseTenantMixin):
+    class Meta:
+        app_label = 'tenant_schemas'
+
+
+class LazyTenant(LazyMigrationTenantMixin):
+    class Meta:
+        app_label = 'tenant_schemas'
+
+
+class AppSetTenant(TenantMixin):
+    app_set = models.CharField(max_length=100, blank=True, default='')
+
+    class Meta:
+        app_label = 'tenant_schemas'
@@ -0,0 +1,110 @@
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from dts_test_app.models import DummyModel
+from tenant_schemas.clone import clone_schema
+from tenant_schemas.tests.models import Tenant
+from tenant_schemas.tests.testcases import BaseTestCase
+from tenant_schemas.utils import get_public_schema_name, schema_exists, tenant_context
+
+
+class CloneSchemaTest(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sync_shared()
+        Tenant(domain_url="test.com", schema_name=get_public_schema_name()).save(
+            verbosity=cls.get_verbosity()
+        )
+
+    def get_applied_migrations(self, schema_name):
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT app, name FROM %s.django_migrations ORDER BY app, name" % schema_name
+        )
+        return cursor.fetchall()
+
+    @override_settings(TENANT_TEMPLATE_SCHEMA="tenant_template")
+    def test_tenant_schema_is_cloned_from_template(self):
+        """
+        With a template schema, the tenant schema should be a copy of it.
+        """
+        tenant = Tenant(domain_url="something.test.com", schema_name="cloned")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        self.assertTrue(schema_exists("tenant_template"))
+        self.assertEqual(
+            sorted(self.get_tables_list_in_schema("tenant_template")),
+            sorted(self.get_tables_list_in_schema(tenant.schema_name)),
+        )
+        self.assertEqual(
+            self.get_applied_migrations("tenant_template"),
+            self.get_applied_migrations(tenant.schema_name),
+        )
+
+        with tenant_context(tenant):
+            DummyModel(name="Schemas are").save()
+            DummyModel(name="awesome!").save()
+            self.assertEqual(2, DummyModel.objects.count())
+
+        # the template is left untouched
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM tenant_template.dts_test_app_dummymodel")
+            self.assertEqual(0, cursor.fetchone()[0])
+
+    def test_clone_schema_with_data(self):
+        """
+        Rows and sequence values are copied along with the structure.
+        """
+        tenant = Tenant(domain_url="something.test.com", schema_name="source")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        with tenant_context(tenant):
+            first = DummyModel.objects.create(name="Schemas are")
+
+        clone_schema("source", "source_copy")
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, name FROM source_copy.dts_test_app_dummymodel")
+            self.assertEqual([(first.pk, "Schemas are")], cursor.fetchall())
+            cursor.execute(
+                "INSERT INTO source_copy.dts_test_app_dummymodel (name) "
+                "VALUES ('awesome!') RETURNING id"
+            )
+            self.assertGreater(cursor.fetchone()[0], first.pk)
+
+    def test_clone_schema_without_data(self):
+        tenant = Tenant(domain_url="something.test.com", schema_name="source")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        with tenant_context(tenant):
+            DummyModel.objects.create(name="Schemas are")
+
+        clone_schema("source", "empty_copy", include_data=False)
+
+        self.assertIn("dts_test_app_dummymodel", self.get_tables_list_in_schema("empty_copy"))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM empty_copy.dts_test_app_dummymodel")
+            self.assertEqual(0, cursor.fetchone()[0])
+
+    def test_clone_from(self):
+        """
+        The rows of the source tenant replace the ones of the target tenant
+        and the sequences follow.
+        """
+        source = Tenant(domain_url="source.test.com", schema_name="source")
+        source.save(verbosity=BaseTestCase.get_verbosity())
+        target = Tenant(domain_url="target.test.com", schema_name="target")
+        target.save(verbosity=BaseTestCase.get_verbosity())
+        with tenant_context(source):
+            first = DummyModel.objects.create(name="Schemas are")
+            second = DummyModel.objects.create(name="awesome!")
+        with tenant_context(target):
+            DummyModel.objects.create(name="replaced")
+
+        call_command("clone_tenant", "source", "target", verbosity=0)
+
+        with tenant_context(target):
+            self.assertEqual(
+                [(first.pk, "Schemas are"), (second.pk, "awesome!")],
+                list(DummyModel.objects.order_by("pk").values_list("pk", "name")),
+            )
+            self.assertGreater(DummyModel.objects.create(name="new").pk, second.pk)
@@ -0,0 +1,42 @@
+import json
+
+from mock import patch
+
+from django.db import connection
+from dts_test_app.models import DummyModel
+from tenant_schemas.explain import SampledExplainWrapper
+from tenant_schemas.test.cases import TenantTestCase
+
+
+class SampledExplainWrapperTestCase(TenantTestCase):
+    def test_slow_query_is_explained_with_schema_name(self):
+        wrapper = SampledExplainWrapper(threshold=0, sample_rate=1)
+        with self.assertLogs('tenant_schemas.explain', 'INFO') as logs:
+            with connection.execute_wrapper(wrapper):
+                DummyModel.objects.count()
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(self.tenant.schema_name, entry['schema_name'])
+        self.assertIn('Plan', entry['plan'][0])
+
+    def test_fast_query_is_not_explained(self):
+        wrapper = SampledExplainWrapper(threshold=60000, sample_rate=1)
+        with patch.object(wrapper, 'record') as record:
+            with connection.execute_wrapper(wrapper):
+                DummyModel.objects.count()
+        record.assert_not_called()
+
+    def test_per_schema_threshold(self):
+        wrapper = SampledExplainWrapper(
+            threshold=60000, sample_rate=1,
+            schema_thresholds={self.tenant.schema_name: 0},
+        )
+        self.assertEqual(0, wrapper.get_threshold(self.tenant.schema_name))
+        self.assertEqual(60000, wrapper.get_threshold('other'))
+
+    def test_only_dml_is_explainable(self):
+        wrapper = SampledExplainWrapper()
+        self.assertTrue(wrapper.is_explainable('SELECT 1'))
+        self.assertTrue(wrapper.is_explainable('  (SELECT 1) UNION (SELECT 2)'))
+        self.assertFalse(wrapper.is_explainable('CREATE TABLE foo (id int)'))
+        self.assertFalse(wrapper.is_explainable('SAVEPOINT s1'))
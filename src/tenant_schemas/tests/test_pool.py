@@ -0,0 +1,53 @@
+from django.test import override_settings
+from dts_test_app.models import DummyModel
+from tenant_schemas.pool import refill_schema_pool, spare_schemas
+from tenant_schemas.tests.models import Tenant
+from tenant_schemas.tests.testcases import BaseTestCase
+from tenant_schemas.utils import get_public_schema_name, schema_exists, tenant_context
+
+
+@override_settings(
+    TENANT_SCHEMA_POOL_SIZE=2,
+    TENANT_SCHEMA_POOL_LOW_WATERMARK=1,
+    TENANT_SCHEMA_POOL_REFILL_IN_BACKGROUND=False,
+)
+class SchemaPoolTest(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sync_shared()
+        Tenant(domain_url="test.com", schema_name=get_public_schema_name()).save(
+            verbosity=cls.get_verbosity()
+        )
+
+    def test_refill_schema_pool(self):
+        self.assertEqual(2, refill_schema_pool(verbosity=BaseTestCase.get_verbosity()))
+        self.assertEqual(2, len(spare_schemas()))
+        self.assertEqual(0, refill_schema_pool(verbosity=BaseTestCase.get_verbosity()))
+
+    def test_tenant_claims_spare_schema(self):
+        """
+        A new tenant gets one of the spare schemas, migrated and ready.
+        """
+        refill_schema_pool(verbosity=BaseTestCase.get_verbosity())
+        spares = spare_schemas()
+
+        tenant = Tenant(domain_url="something.test.com", schema_name="pooled")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        self.assertTrue(schema_exists(tenant.schema_name))
+        self.assertEqual(spares[1:], spare_schemas())
+        with tenant_context(tenant):
+            DummyModel(name="No migrations were run").save()
+            self.assertEqual(1, DummyModel.objects.count())
+
+    def test_pool_is_refilled_below_low_watermark(self):
+        refill_schema_pool(verbosity=BaseTestCase.get_verbosity())
+
+        for schema_name in ("pooled1", "pooled2"):
+            tenant = Tenant(domain_url="%s.test.com" % schema_name, schema_name=schema_name)
+            # the pool is refilled once the claim is committed
+            with self.captureOnCommitCallbacks(execute=True):
+                tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        self.assertEqual(2, len(spare_schemas()))
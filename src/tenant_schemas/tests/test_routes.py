@@ -1,8 +1,9 @@
 from django.core.exceptions import DisallowedHost
 from django.http import Http404
+from django.test import override_settings
 from django.test.client import RequestFactory
 from tenant_schemas.middleware import DefaultTenantMiddleware, TenantMiddleware
-from tenant_schemas.tests.models import Tenant
+from tenant_schemas.tests.models import DeferredTenant, LazyTenant, Tenant
 from tenant_schemas.tests.testcases import BaseTestCase
 from tenant_schemas.utils import get_public_schema_name
 
@@ -87,3 +88,30 @@ class RoutesTestCase(BaseTestCase):
             self.url, HTTP_HOST=self.non_existent_tenant.domain_url
         )
         self.assertRaises(DisallowedHost, dtm, request)
+
+    @override_settings(TENANT_MODEL="tenant_schemas.DeferredTenant")
+    def test_tenant_not_ready_routing(self):
+        """Answer 503 while the schema of the tenant is being provisioned."""
+        DeferredTenant(domain_url="deferred.test.com", schema_name="deferred").save(
+            verbosity=BaseTestCase.get_verbosity()
+        )
+        request = self.factory.get(self.url, HTTP_HOST="deferred.test.com")
+        response = self.tm(request)
+        self.assertEqual(503, response.status_code)
+        self.assertEqual("5", response["Retry-After"])
+
+    @override_settings(TENANT_MODEL="tenant_schemas.LazyTenant")
+    def test_stale_tenant_is_migrated(self):
+        """The schema of a stale tenant is migrated on its first request."""
+        tenant = LazyTenant(domain_url="lazy.test.com", schema_name="lazy")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        self.assertTrue(tenant.is_migrated)
+        LazyTenant.objects.filter(pk=tenant.pk).update(migration_state="")
+
+        request = self.factory.get(self.url, HTTP_HOST="lazy.test.com")
+        self.tm(request)
+        self.assertEqual(request.tenant.pk, tenant.pk)
+
+        tenant = LazyTenant.objects.get(pk=tenant.pk)
+        self.assertTrue(tenant.is_migrated)
+        self.assertIsNotNone(tenant.last_seen)
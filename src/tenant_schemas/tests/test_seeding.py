@@ -0,0 +1,147 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import Group, Permission
+from django.test import override_settings
+from dts_test_app.models import DummyModel
+from tenant_schemas.seeding import compile_fixtures
+from tenant_schemas.tests.models import Tenant
+from tenant_schemas.tests.testcases import TEST_SETTINGS, BaseTestCase
+from tenant_schemas.utils import get_public_schema_name, tenant_context
+
+
+class SeedingTest(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sync_shared()
+        Tenant(domain_url="test.com", schema_name=get_public_schema_name()).save(
+            verbosity=cls.get_verbosity()
+        )
+
+    def setUp(self):
+        super().setUp()
+        handle, self.fixture = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, "w") as f:
+            json.dump(
+                [
+                    {"model": "dts_test_app.dummymodel", "pk": 1, "fields": {"name": "Schemas are"}},
+                    {"model": "dts_test_app.dummymodel", "pk": 2, "fields": {"name": "awesome!"}},
+                    {"model": "auth.group", "pk": 1, "fields": {"name": "Admins", "permissions": []}},
+                ],
+                f,
+            )
+        self.addCleanup(os.remove, self.fixture)
+
+    def test_seed_is_loaded_in_every_schema(self):
+        seed = compile_fixtures([self.fixture])
+        self.assertEqual(
+            {"dts_test_app_dummymodel", "auth_group", "auth_group_permissions"},
+            {table["name"] for table in seed.tables},
+        )
+
+        for schema_name in ("seeded1", "seeded2"):
+            tenant = Tenant(domain_url="%s.test.com" % schema_name, schema_name=schema_name)
+            tenant.save(verbosity=BaseTestCase.get_verbosity())
+            seed.load(schema_name)
+
+            with tenant_context(tenant):
+                self.assertEqual(
+                    [(1, "Schemas are"), (2, "awesome!")],
+                    list(DummyModel.objects.order_by("pk").values_list("pk", "name")),
+                )
+                self.assertEqual(["Admins"], list(Group.objects.values_list("name", flat=True)))
+                self.assertEqual(3, DummyModel.objects.create(name="new").pk)
+
+    def test_seed_updates_existing_rows(self):
+        seed = compile_fixtures([self.fixture])
+        tenant = Tenant(domain_url="seeded.test.com", schema_name="seeded")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        with tenant_context(tenant):
+            DummyModel.objects.create(pk=1, name="replaced")
+
+        seed.load("seeded")
+
+        with tenant_context(tenant):
+            self.assertEqual("Schemas are", DummyModel.objects.get(pk=1).name)
+
+    def test_seed_many_to_many_rows_by_linked_objects(self):
+        with open(self.fixture, "w") as f:
+            json.dump(
+                [
+                    {
+                        "model": "auth.group",
+                        "pk": 1,
+                        "fields": {
+                            "name": "Admins",
+                            "permissions": [["add_dummymodel", "dts_test_app", "dummymodel"]],
+                        },
+                    },
+                ],
+                f,
+            )
+        seed = compile_fixtures([self.fixture])
+        tenant = Tenant(domain_url="seeded.test.com", schema_name="seeded")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        with tenant_context(tenant):
+            # takes the primary key of the seeded many-to-many row
+            Group.objects.create(pk=2, name="Staff").permissions.add(
+                Permission.objects.get(codename="change_dummymodel")
+            )
+
+        seed.load("seeded")
+        seed.load("seeded")
+
+        with tenant_context(tenant):
+            self.assertEqual(
+                ["add_dummymodel"],
+                list(Group.objects.get(pk=1).permissions.values_list("codename", flat=True)),
+            )
+            self.assertEqual(
+                ["change_dummymodel"],
+                list(Group.objects.get(pk=2).permissions.values_list("codename", flat=True)),
+            )
+
+
+@override_settings(
+    TENANT_APPS=TEST_SETTINGS["TENANT_APPS"] + ("dts_seed_app",),
+    INSTALLED_APPS=TEST_SETTINGS["INSTALLED_APPS"] + ("dts_seed_app",),
+)
+class InheritanceSeedingTest(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sync_shared()
+
+    def test_seed_includes_parent_rows(self):
+        from dts_seed_app.models import Place, Restaurant
+
+        handle, fixture = tempfile.mkstemp(suffix=".json")
+        self.addCleanup(os.remove, fixture)
+        with os.fdopen(handle, "w") as f:
+            json.dump(
+                [
+                    {"model": "dts_seed_app.place", "pk": 1, "fields": {"name": "Square"}},
+                    {"model": "dts_seed_app.place", "pk": 2, "fields": {"name": "Pizzeria"}},
+                    {"model": "dts_seed_app.restaurant", "pk": 2, "fields": {"serves_pizza": True}},
+                ],
+                f,
+            )
+        seed = compile_fixtures([fixture])
+        self.assertEqual(
+            {"dts_seed_app_place", "dts_seed_app_restaurant"},
+            {table["name"] for table in seed.tables},
+        )
+
+        tenant = Tenant(domain_url="seeded.test.com", schema_name="seeded")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        seed.load("seeded")
+
+        with tenant_context(tenant):
+            self.assertEqual(
+                ["Square", "Pizzeria"], list(Place.objects.order_by("pk").values_list("name", flat=True))
+            )
+            restaurant = Restaurant.objects.get()
+            self.assertEqual((2, "Pizzeria", True), (restaurant.pk, restaurant.name, restaurant.serves_pizza))
+            self.assertEqual(3, Restaurant.objects.create(name="Trattoria").pk)
@@ -1,17 +1,65 @@
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+from unittest.mock import patch
+
 from django.contrib.auth.models import User
 from django.core.management import call_command
-from django.db import connection
+from django.core.management.base import CommandError
+from django.db import connection, migrations, models, transaction
+from django.db.migrations import executor as migrations_executor
+from django.db.migrations.exceptions import MigrationSchemaMissing
+from django.db.transaction import TransactionManagementError
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from dts_test_app.models import DummyModel, ModelWithFkToPublicUser
+from tenant_schemas.drop import deleted_schemas, drop_schema_incrementally
 from tenant_schemas.management.commands import tenant_command
+from tenant_schemas.management.commands.migrate_schemas import (
+    LARGEST_FIRST,
+    SMALLEST_FIRST,
+    parse_shard,
+    read_schema_names,
+)
+from tenant_schemas.migration_executors.base import DONE, FAILED, LOCKED, MigrationExecutor
+from tenant_schemas.migration_executors.estimate import (
+    INDEX,
+    METADATA,
+    REWRITE,
+    SCAN,
+    UNKNOWN,
+    classify_operation,
+    estimate_migrations,
+    table_sizes,
+)
+from tenant_schemas.migration_executors.journal import DatabaseJournal, FileJournal
+from tenant_schemas.migration_executors.loader import (
+    CachedMigrationLoader,
+    cached_migration_loader,
+)
+from tenant_schemas.migration_executors.planning import applied_migrations, plan_migrations
+from tenant_schemas.migration_executors.replay import is_replayable
+from tenant_schemas.models import TenantMixin
+from tenant_schemas.signals import post_schema_sync, schema_migrated
 from tenant_schemas.test.cases import TenantTestCase
-from tenant_schemas.tests.models import NonAutoSyncTenant, Tenant
-from tenant_schemas.tests.testcases import BaseTestCase
+from tenant_schemas.tests.models import (
+    AppSetTenant,
+    DeferredTenant,
+    LazyTenant,
+    NonAutoSyncTenant,
+    Tenant,
+)
+from tenant_schemas.tests.testcases import BaseTestCase, BaseTransactionTestCase
 from tenant_schemas.utils import (
     get_public_schema_name,
     get_tenant_model,
     schema_context,
     schema_exists,
+    schema_shard,
+    schema_sizes,
+    schemas_exist,
     tenant_context,
 )
 
@@ -41,6 +89,39 @@ class TenantDataAndSettingsTest(BaseTestCase):
 
         self.assertTrue(schema_exists(tenant.schema_name))
 
+    def test_schemas_exist(self):
+        """
+        Only the schemas that exist are returned, in the case they were given.
+        """
+        Tenant(domain_url="something.test.com", schema_name="test").save(
+            verbosity=BaseTestCase.get_verbosity()
+        )
+        self.assertEqual(
+            {"test", "Test", get_public_schema_name()},
+            schemas_exist(["test", "Test", "missing", get_public_schema_name()]),
+        )
+        self.assertEqual(set(), schemas_exist([]))
+
+    def test_schema_sizes(self):
+        """
+        The size of a schema grows with its rows, missing schemas have no size.
+        """
+        Tenant(domain_url="something.test.com", schema_name="test").save(
+            verbosity=BaseTestCase.get_verbosity()
+        )
+        size = schema_sizes(["test"])["test"]
+        self.assertGreater(size, 0)
+
+        with schema_context("test"):
+            DummyModel.objects.bulk_create(
+                [DummyModel(name="dummy %d" % i) for i in range(2000)]
+            )
+        sizes = schema_sizes(["test", "Test", "missing"])
+        self.assertGreater(sizes["test"], size)
+        self.assertEqual(sizes["test"], sizes["Test"])
+        self.assertEqual(0, sizes["missing"])
+        self.assertEqual({}, schema_sizes([]))
+
     def test_non_auto_sync_tenant(self):
         """
         When saving a tenant that has the flag auto_create_schema as
@@ -122,6 +203,124 @@ class TenantDataAndSettingsTest(BaseTestCase):
 
         Tenant.auto_drop_schema = False
 
+    def test_drop_schema_in_background(self):
+        """
+        When deleting a tenant with drop_schema_in_background=True, the schema
+        should be renamed right away and dropped once the row is deleted.
+        """
+        Tenant.drop_schema_in_background = True
+        tenant = Tenant(domain_url="something.test.com", schema_name="background_drop")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        # Force pending trigger events to be executed
+        cursor = connection.cursor()
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            tenant.delete(force_drop=True)
+
+        self.assertEqual(1, len(callbacks))
+        self.assertFalse(schema_exists("background_drop"))
+        self.assertEqual(1, len(deleted_schemas()))
+        Tenant.drop_schema_in_background = False
+
+    def test_drop_schema_incrementally_needs_autocommit(self):
+        with self.assertRaises(TransactionManagementError):
+            drop_schema_incrementally("test")
+
+    def test_incremental_drop_waits_for_commit(self):
+        """
+        Inside a transaction, the schema is dropped incrementally once the
+        transaction commits.
+        """
+        Tenant.drop_schema_incrementally = True
+        tenant = Tenant(domain_url="something.test.com", schema_name="incremental_drop")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        # Force pending trigger events to be executed
+        cursor = connection.cursor()
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            tenant.delete(force_drop=True)
+        self.assertEqual(1, len(callbacks))
+        self.assertTrue(schema_exists("incremental_drop"))
+        Tenant.drop_schema_incrementally = False
+
+    def test_bulk_delete_reports_progress(self):
+        """
+        Bulk deleting with force_drop drops the schemas in batches and
+        deletes all the rows.
+        """
+        schemas = ["bulk_drop1", "bulk_drop2", "bulk_drop3"]
+        for schema in schemas:
+            Tenant(domain_url="%s.test.com" % schema, schema_name=schema).save(
+                verbosity=BaseTestCase.get_verbosity()
+            )
+
+        # Force pending trigger events to be executed
+        cursor = connection.cursor()
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        progress = []
+        Tenant.objects.filter(schema_name__in=schemas).delete(
+            force_drop=True,
+            batch_size=2,
+            progress=lambda done, total: progress.append((done, total)),
+        )
+
+        self.assertEqual([(2, 3), (3, 3)], progress)
+        self.assertFalse(Tenant.objects.filter(schema_name__in=schemas).exists())
+        for schema in schemas:
+            self.assertFalse(schema_exists(schema))
+
+    def test_bulk_create_tenants(self):
+        """
+        When bulk creating tenants, the schemas of all of them should be
+        created and synced.
+        """
+        schemas = ["bulk_tenant1", "bulk_tenant2", "bulk_tenant3"]
+        synced = []
+
+        def receiver(sender, tenant, **kwargs):
+            synced.append(tenant.schema_name)
+
+        post_schema_sync.connect(receiver, sender=TenantMixin)
+        try:
+            tenants = Tenant.objects.bulk_create_tenants(
+                [Tenant(domain_url="%s.test.com" % schema, schema_name=schema)
+                 for schema in schemas],
+                executor="standard",
+                verbosity=BaseTestCase.get_verbosity(),
+            )
+        finally:
+            post_schema_sync.disconnect(receiver, sender=TenantMixin)
+
+        self.assertEqual(schemas, [tenant.schema_name for tenant in tenants])
+        self.assertEqual(schemas, synced)
+        for schema in schemas:
+            self.assertTrue(schema_exists(schema))
+            self.assertIn("dts_test_app_dummymodel", self.get_tables_list_in_schema(schema))
+
+    def test_bulk_create_tenants_in_transaction(self):
+        """
+        Inside a transaction, the schemas are migrated from the connection
+        that created them, whatever the executor.
+        """
+        schemas = ["bulk_atomic1", "bulk_atomic2"]
+        with transaction.atomic():
+            Tenant.objects.bulk_create_tenants(
+                [Tenant(domain_url="%s.test.com" % schema, schema_name=schema)
+                 for schema in schemas],
+                executor="parallel",
+                verbosity=BaseTestCase.get_verbosity(),
+            )
+            self.assertEqual(2, Tenant.objects.filter(schema_name__in=schemas).count())
+
+        self.assertEqual(2, Tenant.objects.filter(schema_name__in=schemas).count())
+        for schema in schemas:
+            self.assertIn("dts_test_app_dummymodel", self.get_tables_list_in_schema(schema))
+
     def test_switching_search_path(self):
         tenant1 = Tenant(domain_url="something.test.com", schema_name="tenant1")
         tenant1.save(verbosity=BaseTestCase.get_verbosity())
@@ -164,6 +363,60 @@ class TenantDataAndSettingsTest(BaseTestCase):
             DummyModel(name="Survived it!").save()
 
 
+class DeferredProvisioningTest(BaseTestCase):
+    """
+    Tests that tenants inheriting DeferredSchemaTenantMixin get their schema
+    created outside of save().
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sync_shared()
+
+    def test_schema_is_not_created_on_save(self):
+        tenant = DeferredTenant(domain_url="something.test.com", schema_name="deferred")
+        with self.captureOnCommitCallbacks() as callbacks:
+            tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        self.assertEqual(1, len(callbacks))
+        self.assertFalse(tenant.is_ready)
+        self.assertEqual(
+            DeferredTenant.PROVISIONING,
+            DeferredTenant.objects.get(pk=tenant.pk).provisioning_state,
+        )
+        self.assertFalse(schema_exists(tenant.schema_name))
+
+    def test_provision_schema_now(self):
+        tenant = DeferredTenant(domain_url="something.test.com", schema_name="deferred")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        tenant.provision_schema_now(verbosity=BaseTestCase.get_verbosity())
+
+        self.assertTrue(tenant.is_ready)
+        self.assertTrue(DeferredTenant.objects.get(pk=tenant.pk).is_ready)
+        self.assertTrue(schema_exists(tenant.schema_name))
+
+    def test_provision_schema_again_after_failed_migrate(self):
+        """
+        The schema created by an attempt whose migrate failed is migrated
+        by the next attempt.
+        """
+        tenant = DeferredTenant(domain_url="something.test.com", schema_name="deferred")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        with patch("tenant_schemas.models.call_command", side_effect=CommandError("failed")):
+            with self.assertRaises(CommandError):
+                tenant.provision_schema_now(verbosity=BaseTestCase.get_verbosity())
+        self.assertEqual(DeferredTenant.FAILED, tenant.provisioning_state)
+        self.assertTrue(schema_exists(tenant.schema_name))
+
+        tenant.provision_schema_now(verbosity=BaseTestCase.get_verbosity())
+
+        self.assertTrue(DeferredTenant.objects.get(pk=tenant.pk).is_ready)
+        self.assertEqual({}, plan_migrations([tenant.schema_name]))
+
+
 class TenantSyncTest(BaseTestCase):
     """
     Tests if the shared apps and the tenant apps get synced correctly
@@ -284,6 +537,728 @@ class TenantSyncTest(BaseTestCase):
         self.assertIn("django_session", tenant_tables)
 
 
+class CachedMigrationLoaderTest(BaseTestCase):
+    def test_graph_is_built_once(self):
+        """
+        Within a migrate_schemas run, the loaders of every schema share the
+        migration graph but read their own applied migrations.
+        """
+        self.sync_shared()
+        tenant = Tenant(domain_url="something.test.com", schema_name="test")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        with cached_migration_loader():
+            with schema_context(get_public_schema_name()):
+                public_loader = migrations_executor.MigrationLoader(connection)
+            with tenant_context(tenant):
+                tenant_loader = migrations_executor.MigrationLoader(connection)
+
+        self.assertIsInstance(public_loader, CachedMigrationLoader)
+        self.assertIs(public_loader.graph, tenant_loader.graph)
+        self.assertIn(("dts_test_app", "0001_initial"), tenant_loader.applied_migrations)
+        self.assertNotIn(("dts_test_app", "0001_initial"), public_loader.applied_migrations)
+        self.assertIsNot(CachedMigrationLoader, migrations_executor.MigrationLoader)
+
+    def test_overlapping_runs_share_the_loader(self):
+        entered, release = threading.Event(), threading.Event()
+
+        def run():
+            with cached_migration_loader():
+                entered.set()
+                release.wait()
+
+        with cached_migration_loader():
+            thread = threading.Thread(target=run)
+            thread.start()
+            entered.wait()
+
+        # the run of the thread is still going on
+        self.assertIs(CachedMigrationLoader, migrations_executor.MigrationLoader)
+        self.assertTrue(CachedMigrationLoader._disk_cache)
+        release.set()
+        thread.join()
+        self.assertIsNot(CachedMigrationLoader, migrations_executor.MigrationLoader)
+        self.assertFalse(CachedMigrationLoader._disk_cache)
+
+
+class MigrationPlanningTest(BaseTestCase):
+    def test_only_schemas_with_pending_migrations_are_planned(self):
+        self.sync_shared()
+        for schema_name in ("planned1", "planned2"):
+            Tenant(domain_url="%s.test.com" % schema_name, schema_name=schema_name).save(
+                verbosity=BaseTestCase.get_verbosity()
+            )
+        self.assertEqual({}, plan_migrations(["planned1", "planned2"]))
+
+        cursor = connection.cursor()
+        cursor.execute(
+            "DELETE FROM planned2.django_migrations "
+            "WHERE app = 'dts_test_app' AND name = '0004_test_alter_unique'"
+        )
+        self.assertEqual(
+            {"planned2": {("dts_test_app", "0004_test_alter_unique")}},
+            plan_migrations(["planned1", "planned2"]),
+        )
+        self.assertEqual(
+            {("dts_test_app", "0004_test_alter_unique")},
+            applied_migrations(["planned1"])["planned1"]
+            - applied_migrations(["planned2"])["planned2"],
+        )
+
+
+class AppSetTest(BaseTestCase):
+    def table_exists(self, schema_name, table):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT EXISTS(SELECT 1 FROM information_schema.tables "
+                "WHERE table_schema = %s AND table_name = %s)",
+                (schema_name, table),
+            )
+            return cursor.fetchone()[0]
+
+    @override_settings(
+        TENANT_MODEL="tenant_schemas.AppSetTenant", TENANT_APP_SETS={"minimal": []}
+    )
+    def test_only_the_apps_of_the_app_set_are_migrated(self):
+        self.sync_shared()
+        tenant = AppSetTenant(
+            domain_url="minimal.test.com", schema_name="minimal", app_set="minimal"
+        )
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        self.assertFalse(self.table_exists("minimal", "dts_test_app_dummymodel"))
+        self.assertTrue(self.table_exists("minimal", "django_migrations"))
+
+        tenant.change_app_set("", verbosity=BaseTestCase.get_verbosity())
+        self.assertTrue(self.table_exists("minimal", "dts_test_app_dummymodel"))
+        self.assertEqual("", AppSetTenant.objects.get(pk=tenant.pk).app_set)
+
+        # the recorded migrations are consistent
+        call_command(
+            "migrate_schemas",
+            schema_name="minimal",
+            interactive=False,
+            verbosity=BaseTestCase.get_verbosity(),
+        )
+        self.assertEqual({}, plan_migrations(["minimal"]))
+
+    @override_settings(
+        TENANT_MODEL="tenant_schemas.AppSetTenant", TENANT_APP_SETS={"minimal": []}
+    )
+    def test_clone_needs_the_same_app_set(self):
+        self.sync_shared()
+        source = AppSetTenant(domain_url="source.test.com", schema_name="source", app_set="")
+        source.save(verbosity=BaseTestCase.get_verbosity())
+        target = AppSetTenant(
+            domain_url="target.test.com", schema_name="target", app_set="minimal"
+        )
+        target.save(verbosity=BaseTestCase.get_verbosity())
+
+        with self.assertRaisesMessage(Exception, "app set"):
+            target.clone_from(source)
+
+    @override_settings(
+        TENANT_MODEL="tenant_schemas.AppSetTenant", TENANT_APP_SETS={"minimal": []}
+    )
+    def test_removed_app_cant_be_added_back(self):
+        self.sync_shared()
+        tenant = AppSetTenant(domain_url="full.test.com", schema_name="full", app_set="")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        tenant.change_app_set("minimal", verbosity=BaseTestCase.get_verbosity())
+        self.assertTrue(self.table_exists("full", "dts_test_app_dummymodel"))
+
+        with self.assertRaisesMessage(Exception, "Can't add back the apps"):
+            tenant.change_app_set("", verbosity=BaseTestCase.get_verbosity())
+        self.assertEqual("minimal", tenant.app_set)
+        self.assertEqual("minimal", AppSetTenant.objects.get(pk=tenant.pk).app_set)
+
+
+class LazyMigrationTest(BaseTestCase):
+    @override_settings(TENANT_MODEL="tenant_schemas.LazyTenant")
+    def test_only_active_tenants_are_migrated(self):
+        self.sync_shared()
+        active = LazyTenant(domain_url="active.test.com", schema_name="active")
+        active.save(verbosity=BaseTestCase.get_verbosity())
+        active.mark_seen()
+        dormant = LazyTenant(domain_url="dormant.test.com", schema_name="dormant")
+        dormant.save(verbosity=BaseTestCase.get_verbosity())
+        LazyTenant.objects.update(migration_state="")
+
+        call_command(
+            "migrate_schemas",
+            tenant=True,
+            lazy=True,
+            interactive=False,
+            verbosity=BaseTestCase.get_verbosity(),
+        )
+        self.assertTrue(LazyTenant.objects.get(pk=active.pk).is_migrated)
+        self.assertFalse(LazyTenant.objects.get(pk=dormant.pk).is_migrated)
+
+        dormant = LazyTenant.objects.get(pk=dormant.pk)
+        self.assertTrue(dormant.migrate_schema_now())
+        self.assertTrue(LazyTenant.objects.get(pk=dormant.pk).is_migrated)
+
+    @override_settings(TENANT_MODEL="tenant_schemas.LazyTenant")
+    def test_bulk_created_tenants_are_migrated(self):
+        self.sync_shared()
+        tenants = LazyTenant.objects.bulk_create_tenants(
+            [LazyTenant(domain_url="%s.test.com" % schema, schema_name=schema)
+             for schema in ("bulk_lazy1", "bulk_lazy2")],
+            verbosity=BaseTestCase.get_verbosity(),
+        )
+        for tenant in tenants:
+            self.assertTrue(tenant.is_migrated)
+            self.assertTrue(LazyTenant.objects.get(pk=tenant.pk).is_migrated)
+
+    @override_settings(TENANT_MODEL="tenant_schemas.LazyTenant")
+    def test_background_migration_is_submitted_once(self):
+        self.sync_shared()
+        tenant = LazyTenant(domain_url="lazy.test.com", schema_name="lazy")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        future = Future()
+        with patch("tenant_schemas.models.workers.submit", return_value=future) as submit:
+            self.assertIs(future, tenant.migrate_schema_in_background())
+            self.assertIsNone(LazyTenant.objects.get(pk=tenant.pk).migrate_schema_in_background())
+            self.assertEqual(1, submit.call_count)
+
+            future.set_result(True)
+            tenant.migrate_schema_in_background()
+            self.assertEqual(2, submit.call_count)
+
+
+class MigrationEstimateTest(BaseTestCase):
+    def test_table_sizes(self):
+        self.sync_shared()
+        Tenant(domain_url="estimated.test.com", schema_name="estimated").save(
+            verbosity=BaseTestCase.get_verbosity()
+        )
+        sizes = table_sizes(["estimated", "Estimated", "missing"], ["dts_test_app_dummymodel"])
+        self.assertEqual(
+            {("estimated", "dts_test_app_dummymodel"), ("Estimated", "dts_test_app_dummymodel")},
+            set(sizes),
+        )
+        self.assertEqual(
+            sizes[("estimated", "dts_test_app_dummymodel")],
+            sizes[("Estimated", "dts_test_app_dummymodel")],
+        )
+
+    def test_classify_operation(self):
+        self.assertEqual(
+            REWRITE,
+            classify_operation(migrations.AlterField("dummymodel", "name", models.TextField())),
+        )
+        self.assertEqual(
+            INDEX,
+            classify_operation(
+                migrations.AddField("dummymodel", "code", models.IntegerField(unique=True))
+            ),
+        )
+        self.assertEqual(
+            METADATA,
+            classify_operation(
+                migrations.AddField("dummymodel", "code", models.IntegerField(null=True))
+            ),
+        )
+        self.assertEqual(UNKNOWN, classify_operation(migrations.RunSQL("SELECT 1")))
+
+    def test_classify_alter_field(self):
+        """
+        An AlterField is classified from what changes in the field.
+        """
+        old_field = models.CharField(max_length=100, null=True)
+
+        def classify(field):
+            return classify_operation(
+                migrations.AlterField("dummymodel", "name", field), old_field
+            )
+
+        self.assertEqual(REWRITE, classify(models.IntegerField(null=True)))
+        self.assertEqual(SCAN, classify(models.CharField(max_length=100)))
+        self.assertEqual(INDEX, classify(models.CharField(max_length=100, null=True, unique=True)))
+        self.assertEqual(
+            INDEX, classify(models.CharField(max_length=100, null=True, db_index=True))
+        )
+        self.assertEqual(
+            METADATA, classify(models.CharField(max_length=100, null=True, default="name"))
+        )
+
+    def test_pending_migrations_are_estimated(self):
+        self.sync_shared()
+        Tenant(domain_url="estimated.test.com", schema_name="estimated").save(
+            verbosity=BaseTestCase.get_verbosity()
+        )
+        self.assertEqual({}, estimate_migrations(["estimated"]))
+
+        call_command(
+            "migrate_schemas",
+            schema_name="estimated",
+            app_label="dts_test_app",
+            migration_name="0003_test_add_db_index",
+            interactive=False,
+            verbosity=BaseTestCase.get_verbosity(),
+        )
+        # 0004 makes the indexed field unique, then removes it.
+        estimate = estimate_migrations(["estimated"])["estimated"]
+        self.assertEqual(1, estimate["migrations"])
+        self.assertEqual(0, estimate[REWRITE])
+        self.assertEqual(1, estimate[INDEX])
+        self.assertEqual(1, estimate[METADATA])
+
+        out = StringIO()
+        call_command("migrate_schemas", schema_name="estimated", estimate=True, stdout=out)
+        self.assertIn(
+            "estimated: 1 migrations, 0 table rewrites, 1 index builds", out.getvalue()
+        )
+        self.assertEqual(1, len(plan_migrations(["estimated"])))
+
+
+class MigrationJournalTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        fd, self.path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+        super().tearDown()
+
+    def test_last_result_of_a_schema_wins(self):
+        journal = FileJournal(self.path)
+        journal.record({"schema_name": "journal1", "status": FAILED, "error": "Error: ..."})
+        journal.record({"schema_name": "journal1", "status": DONE, "error": None})
+        journal.record({"schema_name": "journal2", "status": FAILED, "error": "Error: ..."})
+        self.assertEqual({"journal1"}, journal.completed())
+
+        journal.reset()
+        self.assertEqual(set(), journal.completed())
+
+    def test_resume_skips_migrated_schemas(self):
+        self.sync_shared()
+        schema_names = ["journal1", "journal2"]
+        for schema_name in schema_names:
+            Tenant(domain_url="%s.test.com" % schema_name, schema_name=schema_name).save(
+                verbosity=BaseTestCase.get_verbosity()
+            )
+
+        call_command(
+            "migrate_schemas",
+            schema_names=schema_names,
+            journal=self.path,
+            interactive=False,
+            verbosity=BaseTestCase.get_verbosity(),
+        )
+        self.assertEqual(set(schema_names), FileJournal(self.path).completed())
+
+        out = StringIO()
+        call_command(
+            "migrate_schemas",
+            schema_names=schema_names,
+            journal=self.path,
+            resume=True,
+            interactive=False,
+            stdout=out,
+        )
+        self.assertIn("0 tenant schemas migrated, 0 failed, 2 skipped", out.getvalue())
+
+    def test_database_journal_creates_its_table_once(self):
+        self.sync_shared()
+        journal = DatabaseJournal()
+        with CaptureQueriesContext(connection) as queries:
+            journal.reset()
+            journal.record({"schema_name": "journal1", "status": FAILED, "error": "Error: ..."})
+            journal.record({"schema_name": "journal1", "status": DONE, "error": None})
+            self.assertEqual({"journal1"}, journal.completed())
+        self.assertEqual(
+            1, len([query for query in queries if query["sql"].startswith("CREATE TABLE")])
+        )
+
+
+class MigrationReportTest(BaseTestCase):
+    def test_report_and_signal(self):
+        self.sync_shared()
+        Tenant(domain_url="reported.test.com", schema_name="reported").save(
+            verbosity=BaseTestCase.get_verbosity()
+        )
+        call_command(
+            "migrate_schemas",
+            schema_name="reported",
+            app_label="dts_test_app",
+            migration_name="0003_test_add_db_index",
+            interactive=False,
+            verbosity=BaseTestCase.get_verbosity(),
+        )
+
+        results = []
+
+        def receiver(sender, result, **kwargs):
+            results.append(result)
+
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        schema_migrated.connect(receiver)
+        try:
+            call_command(
+                "migrate_schemas",
+                schema_name="reported",
+                interactive=False,
+                report=path,
+                verbosity=BaseTestCase.get_verbosity(),
+            )
+            with open(path) as f:
+                report = json.load(f)
+        finally:
+            schema_migrated.disconnect(receiver)
+            os.remove(path)
+
+        self.assertEqual(1, len(report))
+        self.assertEqual("reported", report[0]["schema_name"])
+        self.assertEqual(DONE, report[0]["status"])
+        self.assertEqual(1, report[0]["applied"])
+        self.assertIsNotNone(report[0]["duration"])
+        self.assertEqual(report, [{key: result[key] for key in report[0]} for result in results])
+
+
+class ShardingTest(BaseTestCase):
+    def test_shards(self):
+        schema_names = ["tenant%d" % i for i in range(100)]
+        shards = [schema_shard(schema_name, 4) for schema_name in schema_names]
+        self.assertEqual({1, 2, 3, 4}, set(shards))
+        self.assertEqual(shards, [schema_shard(schema_name, 4) for schema_name in schema_names])
+
+        self.assertEqual((2, 4), parse_shard("2/4"))
+        for value in ("0/4", "5/4", "2", "a/b"):
+            with self.assertRaises(CommandError):
+                parse_shard(value)
+
+    def test_read_schema_names(self):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as f:
+            f.write("# slow tenants\ntenant1\n\n  tenant2 \n")
+        try:
+            self.assertEqual(["tenant1", "tenant2"], read_schema_names(path))
+        finally:
+            os.remove(path)
+
+    def migrate(self, **options):
+        """
+        Runs migrate_schemas and returns the schemas it migrated, in order.
+        """
+        migrated = []
+
+        def receiver(sender, result, **kwargs):
+            migrated.append(result["schema_name"])
+
+        schema_migrated.connect(receiver)
+        try:
+            call_command(
+                "migrate_schemas",
+                tenant=True,
+                executor="standard",
+                interactive=False,
+                verbosity=BaseTestCase.get_verbosity(),
+                **options
+            )
+        finally:
+            schema_migrated.disconnect(receiver)
+        return migrated
+
+    def test_shards_split_the_tenants(self):
+        self.sync_shared()
+        schema_names = ["sharded%d" % i for i in range(8)]
+        for schema_name in schema_names:
+            Tenant(domain_url="%s.test.com" % schema_name, schema_name=schema_name).save(
+                verbosity=BaseTestCase.get_verbosity()
+            )
+
+        shards = [self.migrate(shard="%d/3" % index) for index in (1, 2, 3)]
+        self.assertEqual(sorted(schema_names), sorted(sum(shards, [])))
+        for index, shard in enumerate(shards, 1):
+            self.assertEqual(
+                [schema_name for schema_name in schema_names
+                 if schema_shard(schema_name, 3) == index],
+                sorted(shard),
+            )
+
+    def test_tenants_from(self):
+        self.sync_shared()
+        for schema_name in ("listed1", "listed2", "unlisted"):
+            Tenant(domain_url="%s.test.com" % schema_name, schema_name=schema_name).save(
+                verbosity=BaseTestCase.get_verbosity()
+            )
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "w") as f:
+            f.write("listed1\nlisted2\n")
+
+        self.assertEqual(["listed1", "listed2"], self.migrate(tenants_from=path))
+
+        with open(path, "a") as f:
+            f.write("unknown\n")
+        with self.assertRaises(MigrationSchemaMissing):
+            self.migrate(tenants_from=path)
+
+
+class MigrationOrderTest(BaseTestCase):
+    migrate = ShardingTest.migrate
+
+    def test_schemas_are_migrated_in_size_order(self):
+        self.sync_shared()
+        for schema_name, rows in (("medium", 500), ("small", 0), ("large", 5000)):
+            tenant = Tenant(domain_url="%s.test.com" % schema_name, schema_name=schema_name)
+            tenant.save(verbosity=BaseTestCase.get_verbosity())
+            with tenant_context(tenant):
+                DummyModel.objects.bulk_create(
+                    DummyModel(name="row %d" % i) for i in range(rows))
+
+        self.assertEqual(["large", "medium", "small"], self.migrate(order=LARGEST_FIRST))
+        self.assertEqual(["small", "medium", "large"], self.migrate(order=SMALLEST_FIRST))
+
+
+class LockTimeoutRetryTest(BaseTestCase):
+    @override_settings(TENANT_MIGRATION_LOCK_RETRIES=2, TENANT_MIGRATION_LOCK_BACKOFF=0)
+    def test_locked_schemas_are_retried(self):
+        rounds = []
+
+        class Executor(MigrationExecutor):
+            def run_tenant_migrations(self, tenants):
+                rounds.append((list(tenants), self.retry_lock_timeout))
+                for schema_name in tenants:
+                    status = LOCKED if schema_name == "locked" and len(rounds) < 3 else DONE
+                    self.schema_migrated(
+                        {"schema_name": schema_name, "status": status, "error": None}
+                    )
+
+        executor = Executor([], {})
+        executor.run_migrations(["free", "locked"])
+        self.assertEqual(
+            [(["free", "locked"], True), (["locked"], True), (["locked"], False)], rounds
+        )
+        self.assertEqual(
+            ["free", "locked"], [result["schema_name"] for result in executor.results]
+        )
+
+
+class BackgroundDropTest(BaseTransactionTestCase):
+    schema_names = ["background_drop"]
+
+    def tearDown(self):
+        cursor = connection.cursor()
+        for schema_name in deleted_schemas():
+            cursor.execute("DROP SCHEMA IF EXISTS %s CASCADE" % schema_name)
+        super().tearDown()
+
+    @patch.object(Tenant, "drop_schema_in_background", True)
+    def test_drop_schema_in_background_in_autocommit(self):
+        """
+        Outside of a transaction, the schema is renamed along with the row
+        deletion and its drop queued once both are committed.
+        """
+        tenant = Tenant(domain_url="something.test.com", schema_name="background_drop")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        pk = tenant.pk
+
+        with patch("tenant_schemas.models.workers.submit") as submit:
+            tenant.delete(force_drop=True)
+
+        self.assertFalse(Tenant.objects.filter(pk=pk).exists())
+        self.assertFalse(schema_exists("background_drop"))
+        self.assertEqual(1, len(deleted_schemas()))
+        submit.assert_called_once_with(drop_schema_incrementally, deleted_schemas()[0])
+
+
+class ParallelExecutorTest(BaseTransactionTestCase):
+    schema_names = ["parallel1", "parallel2", "parallel3"]
+
+    @override_settings(TENANT_PARALLEL_MIGRATION_MAX_TASKS_PER_CHILD=1)
+    def test_workers_replaced_after_every_schema(self):
+        """
+        The workers started after the journal records a result don't use
+        the connection it opened in the parent.
+        """
+        for schema_name in self.schema_names:
+            Tenant(domain_url="%s.test.com" % schema_name, schema_name=schema_name).save(
+                verbosity=BaseTestCase.get_verbosity()
+            )
+            call_command(
+                "migrate_schemas",
+                schema_name=schema_name,
+                app_label="dts_test_app",
+                migration_name="0003_test_add_db_index",
+                interactive=False,
+                verbosity=BaseTestCase.get_verbosity(),
+            )
+
+        call_command(
+            "migrate_schemas",
+            schema_names=self.schema_names,
+            executor="parallel",
+            journal="db",
+            interactive=False,
+            verbosity=BaseTestCase.get_verbosity(),
+        )
+
+        self.assertEqual({}, plan_migrations(self.schema_names))
+        self.assertEqual(set(self.schema_names), DatabaseJournal().completed())
+
+
+class ThreadedExecutorTest(BaseTransactionTestCase):
+    schema_names = ["threaded1", "threaded2", "threaded3"]
+
+    @override_settings(TENANT_THREADED_MIGRATION_MAX_THREADS=2)
+    def test_schemas_are_migrated_from_threads(self):
+        for schema_name in self.schema_names:
+            Tenant(domain_url="%s.test.com" % schema_name, schema_name=schema_name).save(
+                verbosity=BaseTestCase.get_verbosity()
+            )
+            call_command(
+                "migrate_schemas",
+                schema_name=schema_name,
+                app_label="dts_test_app",
+                migration_name="zero",
+                interactive=False,
+                verbosity=BaseTestCase.get_verbosity(),
+            )
+            self.assertNotIn(
+                "dts_test_app_dummymodel", BaseTestCase.get_tables_list_in_schema(schema_name)
+            )
+
+        results = []
+
+        def receiver(sender, result, **kwargs):
+            results.append(result)
+
+        schema_migrated.connect(receiver)
+        try:
+            call_command(
+                "migrate_schemas",
+                schema_names=self.schema_names,
+                executor="threaded",
+                interactive=False,
+                verbosity=BaseTestCase.get_verbosity(),
+            )
+        finally:
+            schema_migrated.disconnect(receiver)
+
+        self.assertEqual(
+            sorted(self.schema_names), sorted(result["schema_name"] for result in results)
+        )
+        self.assertTrue(all(result["status"] == DONE for result in results))
+        self.assertTrue(all(result["applied"] == 4 for result in results))
+        self.assertEqual({}, plan_migrations(self.schema_names))
+        for schema_name in self.schema_names:
+            self.assertIn(
+                "dts_test_app_dummymodel", BaseTestCase.get_tables_list_in_schema(schema_name)
+            )
+
+
+class ReplayExecutorTest(BaseTestCase):
+    def test_pending_migrations_are_replayed(self):
+        """
+        The SQL of the pending migrations is replayed in every schema and
+        the migrations are recorded.
+        """
+        self.sync_shared()
+        schema_names = ["replayed1", "replayed2"]
+        for schema_name in schema_names:
+            Tenant(domain_url="%s.test.com" % schema_name, schema_name=schema_name).save(
+                verbosity=BaseTestCase.get_verbosity()
+            )
+            call_command(
+                "migrate_schemas",
+                schema_name=schema_name,
+                app_label="dts_test_app",
+                migration_name="0003_test_add_db_index",
+                interactive=False,
+                verbosity=BaseTestCase.get_verbosity(),
+            )
+        self.assertEqual(2, len(plan_migrations(schema_names)))
+
+        call_command(
+            "migrate_schemas",
+            schema_names=schema_names,
+            executor="replay",
+            interactive=False,
+            verbosity=BaseTestCase.get_verbosity(),
+        )
+
+        self.assertEqual({}, plan_migrations(schema_names))
+        with connection.cursor() as cursor:
+            for schema_name in schema_names:
+                cursor.execute(
+                    "SELECT count(*) FROM information_schema.columns WHERE table_schema = %s "
+                    "AND table_name = 'dts_test_app_dummymodel' AND column_name = 'indexed_value'",
+                    (schema_name,),
+                )
+                self.assertEqual(0, cursor.fetchone()[0])
+
+    def test_replayed_schemas_match_the_reference(self):
+        """
+        The statements depending on the state of the schema, like dropping
+        the index added by an earlier pending migration, are replayed, and
+        the schemas already up to date get a result.
+        """
+        self.sync_shared()
+        schema_names = ["replayed1", "replayed2", "replayed3"]
+        for schema_name in schema_names:
+            Tenant(domain_url="%s.test.com" % schema_name, schema_name=schema_name).save(
+                verbosity=BaseTestCase.get_verbosity()
+            )
+        for schema_name in schema_names[:2]:
+            call_command(
+                "migrate_schemas",
+                schema_name=schema_name,
+                app_label="dts_test_app",
+                migration_name="0002_test_drop_unique",
+                interactive=False,
+                verbosity=BaseTestCase.get_verbosity(),
+            )
+
+        results = []
+
+        def receiver(sender, result, **kwargs):
+            results.append(result)
+
+        schema_migrated.connect(receiver)
+        try:
+            call_command(
+                "migrate_schemas",
+                schema_names=schema_names,
+                executor="replay",
+                interactive=False,
+                verbosity=BaseTestCase.get_verbosity(),
+            )
+        finally:
+            schema_migrated.disconnect(receiver)
+
+        self.assertEqual({}, plan_migrations(schema_names))
+        self.assertEqual(
+            {"replayed1": 2, "replayed2": 2, "replayed3": 0},
+            {result["schema_name"]: result["applied"] for result in results},
+        )
+        self.assertTrue(all(result["status"] == DONE for result in results))
+        with connection.cursor() as cursor:
+            indexes = []
+            for schema_name in schema_names:
+                cursor.execute(
+                    "SELECT indexname FROM pg_indexes WHERE schemaname = %s "
+                    "AND tablename = 'dts_test_app_dummymodel' ORDER BY indexname",
+                    (schema_name,),
+                )
+                indexes.append(cursor.fetchall())
+        self.assertEqual(indexes[0], indexes[1])
+        self.assertEqual(indexes[0], indexes[2])
+
+    def test_python_migrations_are_not_replayed(self):
+        operations = [migrations.RunPython(migrations.RunPython.noop)]
+        migration = type("Migration", (migrations.Migration,), {"operations": operations})(
+            "0001_initial", "test"
+        )
+        self.assertFalse(is_replayable([(migration, False)]))
+        migration.operations = [migrations.RunSQL("SELECT 1")]
+        self.assertTrue(is_replayable([(migration, False)]))
+        self.assertFalse(is_replayable([(migration, True)]))
+
+
 class TenantCommandTest(BaseTestCase):
     @override_settings(
         SHARED_APPS=(
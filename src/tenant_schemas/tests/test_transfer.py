@@ -0,0 +1,214 @@
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.transaction import TransactionManagementError
+from dts_test_app.models import DummyModel
+from tenant_schemas.routers import TenantDatabaseRouter
+from tenant_schemas.tests.models import MultiDatabaseTenant, Tenant
+from tenant_schemas import transfer
+from tenant_schemas.transfer import export_schema, import_schema, move_tenant
+from tenant_schemas.tests.testcases import BaseTestCase, BaseTransactionTestCase
+from tenant_schemas.utils import get_public_schema_name, schema_exists, tenant_context
+
+
+class TransferSchemaTest(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sync_shared()
+        Tenant(domain_url="test.com", schema_name=get_public_schema_name()).save(
+            verbosity=cls.get_verbosity()
+        )
+
+    def setUp(self):
+        super().setUp()
+        handle, self.archive = tempfile.mkstemp(suffix=".tar")
+        os.close(handle)
+        self.addCleanup(os.remove, self.archive)
+
+    def test_export_and_import_tenant(self):
+        """
+        Rows and sequence values of the exported schema are restored in the
+        new schema.
+        """
+        tenant = Tenant(domain_url="something.test.com", schema_name="exported")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        with tenant_context(tenant):
+            first = DummyModel.objects.create(name="Schemas are")
+            second = DummyModel.objects.create(name="awesome!")
+
+        call_command("export_tenant", self.archive, schema_name="exported", verbosity=0)
+        call_command("import_tenant", self.archive, schema_name="imported", verbosity=0)
+
+        self.assertTrue(schema_exists("imported"))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, name FROM imported.dts_test_app_dummymodel ORDER BY id")
+            self.assertEqual(
+                [(first.pk, "Schemas are"), (second.pk, "awesome!")], cursor.fetchall()
+            )
+            cursor.execute(
+                "INSERT INTO imported.dts_test_app_dummymodel (name) "
+                "VALUES ('again') RETURNING id"
+            )
+            self.assertGreater(cursor.fetchone()[0], second.pk)
+
+    def test_import_into_existing_schema_fails(self):
+        tenant = Tenant(domain_url="something.test.com", schema_name="exported")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        call_command("export_tenant", self.archive, schema_name="exported", verbosity=0)
+        with self.assertRaises(CommandError):
+            call_command("import_tenant", self.archive, verbosity=0)
+        self.assertTrue(schema_exists("exported"))
+
+
+class TransferSchemaTransactionTest(BaseTransactionTestCase):
+    schema_names = ("exported", "imported")
+
+    def setUp(self):
+        super().setUp()
+        Tenant(domain_url="test.com", schema_name=get_public_schema_name()).save(
+            verbosity=BaseTestCase.get_verbosity()
+        )
+        handle, self.archive = tempfile.mkstemp(suffix=".tar")
+        os.close(handle)
+        self.addCleanup(os.remove, self.archive)
+
+    def test_export_from_snapshot_and_import(self):
+        """
+        Tables exported by several workers are read from the same snapshot,
+        so rows committed meanwhile are not in the archive, and the archive
+        is restored in a new schema.
+        """
+        tenant = Tenant(domain_url="something.test.com", schema_name="exported")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        with tenant_context(tenant):
+            DummyModel.objects.bulk_create(DummyModel(name="row %d" % i) for i in range(10))
+            expected = list(DummyModel.objects.order_by("id").values_list("id", "name"))
+
+        def write():
+            # from another connection, committed after the snapshot
+            connection.set_schema("exported")
+            try:
+                DummyModel.objects.create(name="too late")
+            finally:
+                connection.close()
+
+        get_manifest = transfer._get_manifest
+
+        def get_manifest_and_write(*args):
+            thread = threading.Thread(target=write)
+            thread.start()
+            thread.join()
+            return get_manifest(*args)
+
+        with patch("tenant_schemas.transfer._get_manifest", side_effect=get_manifest_and_write):
+            manifest = export_schema("exported", self.archive, workers=4)
+        self.assertGreater(len(manifest["tables"]), 1)
+
+        self.assertEqual("imported", import_schema(
+            self.archive, schema_name="imported", verbosity=BaseTestCase.get_verbosity()))
+        connection.set_schema("imported")
+        self.assertEqual(expected, list(DummyModel.objects.order_by("id").values_list("id", "name")))
+        self.assertGreater(DummyModel.objects.create(name="again").pk, expected[-1][0])
+        connection.set_schema("exported")
+        self.assertEqual(11, DummyModel.objects.count())
+
+
+class MoveTenantTest(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sync_shared()
+
+    def test_tenant_in_default_database_is_not_routed(self):
+        tenant = MultiDatabaseTenant(domain_url="something.test.com", schema_name="test")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        self.assertEqual(DEFAULT_DB_ALIAS, tenant.database)
+
+        with tenant_context(tenant):
+            self.assertIsNone(TenantDatabaseRouter().db_for_read(DummyModel))
+            self.assertIsNone(TenantDatabaseRouter().db_for_write(DummyModel))
+
+    def test_move_tenant_checks(self):
+        tenant = MultiDatabaseTenant(domain_url="something.test.com", schema_name="test")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+
+        with self.assertRaises(ValueError):
+            move_tenant(tenant, DEFAULT_DB_ALIAS)
+
+        # the test runs in a transaction
+        with self.assertRaises(TransactionManagementError):
+            move_tenant(tenant, "other")
+
+
+class MoveTenantTransactionTest(BaseTransactionTestCase):
+    databases = {DEFAULT_DB_ALIAS, "other"}
+    schema_names = ("moved", )
+
+    def setUp(self):
+        super().setUp()
+        call_command(
+            "migrate_schemas",
+            schema_name=get_public_schema_name(),
+            database="other",
+            interactive=False,
+            verbosity=BaseTestCase.get_verbosity(),
+            run_syncdb=True,
+        )
+
+    def tearDown(self):
+        connections["other"].set_schema_to_public()
+        connections["other"].cursor().execute("DROP SCHEMA IF EXISTS moved CASCADE")
+        super().tearDown()
+
+    def test_move_tenant_with_concurrent_writes(self):
+        """
+        Rows inserted, updated and deleted while the tables are copied end
+        up in the target schema.
+        """
+        tenant = MultiDatabaseTenant(domain_url="something.test.com", schema_name="moved")
+        tenant.save(verbosity=BaseTestCase.get_verbosity())
+        with tenant_context(tenant):
+            DummyModel.objects.bulk_create(
+                DummyModel(name="row %d" % i) for i in range(2500))
+        expected = []
+
+        def write():
+            # from another connection, committed during the copy
+            connection.set_schema("moved")
+            try:
+                DummyModel.objects.create(name="inserted")
+                DummyModel.objects.filter(name="row 10").update(name="updated")
+                DummyModel.objects.filter(name="row 2000").delete()
+                expected.extend(DummyModel.objects.order_by("id").values_list("id", "name"))
+            finally:
+                connection.close()
+
+        copy_table = transfer._copy_table
+
+        def copy_table_and_write(*args):
+            copy_table(*args)
+            if not expected:
+                thread = threading.Thread(target=write)
+                thread.start()
+                thread.join()
+
+        with patch("tenant_schemas.transfer._copy_table", side_effect=copy_table_and_write):
+            move_tenant(tenant, "other", verbosity=BaseTestCase.get_verbosity())
+
+        self.assertEqual(2500, len(expected))
+        self.assertFalse(schema_exists("moved"))
+        self.assertTrue(schema_exists("moved", using="other"))
+        self.assertEqual("other", MultiDatabaseTenant.objects.get(pk=tenant.pk).database)
+
+        other = connections["other"]
+        other.set_schema("moved")
+        self.assertEqual(expected, list(
+            DummyModel.objects.using("other").order_by("id").values_list("id", "name")))
+        moved = DummyModel.objects.using("other").create(name="again")
+        self.assertGreater(moved.pk, expected[-1][0])
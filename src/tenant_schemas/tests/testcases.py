@@ -3,12 +3,11 @@ import inspect
 from django.conf import settings
 from django.core.management import call_command
 from django.db import connection
-from django.test import TestCase, override_settings
+from django.test import TestCase, TransactionTestCase, override_settings
 
 from tenant_schemas.utils import get_public_schema_name
 
-
-@override_settings(
+TEST_SETTINGS = dict(
     TENANT_MODEL="tenant_schemas.Tenant",
     SHARED_APPS=("tenant_schemas",),
     TENANT_APPS=("dts_test_app", "django.contrib.contenttypes", "django.contrib.auth"),
@@ -19,6 +18,9 @@ from tenant_schemas.utils import get_public_schema_name
         "django.contrib.auth",
     ),
 )
+
+
+@override_settings(**TEST_SETTINGS)
 class BaseTestCase(TestCase):
     """
     Base test case that comes packed with overloaded INSTALLED_APPS,
@@ -78,3 +80,26 @@ class BaseTestCase(TestCase):
             verbosity=cls.get_verbosity(),
             run_syncdb=True,
         )
+
+
+@override_settings(**TEST_SETTINGS)
+class BaseTransactionTestCase(TransactionTestCase):
+    """
+    Base test case for the tests migrating from other connections, which
+    don't see the data of a test transaction. The schemas listed in
+    schema_names are dropped on tearDown.
+    """
+
+    schema_names = ()
+
+    def setUp(self):
+        connection.set_schema_to_public()
+        BaseTestCase.sync_shared()
+        super().setUp()
+
+    def tearDown(self):
+        connection.set_schema_to_public()
+        cursor = connection.cursor()
+        for schema_name in self.schema_names:
+            cursor.execute("DROP SCHEMA IF EXISTS %s CASCADE" % schema_name)
+        super().tearDown()
@@ -0,0 +1,495 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.transaction import TransactionManagementError
+
+from tenant_schemas.clone import SEQUENCES_SQL, TABLES_SQL, clone_schema, create_template_schema
+from tenant_schemas.postgresql_backend.base import _check_schema_name
+from tenant_schemas.utils import get_template_schema_name, schema_exists
+
+# Version of the archive layout written by export_schema.
+ARCHIVE_VERSION = 1
+
+MANIFEST_NAME = 'manifest.json'
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def get_export_workers():
+    return getattr(settings, 'TENANT_EXPORT_WORKERS', 4)
+
+
+def copy_to(cursor, sql, fileobj):
+    """
+    Runs a COPY ... TO STDOUT statement and writes its output to fileobj,
+    with either psycopg2 or psycopg 3.
+    """
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(sql, fileobj, size=COPY_CHUNK_SIZE)
+    else:
+        with cursor.copy(sql) as copy:
+            for data in copy:
+                fileobj.write(data)
+
+
+def copy_from(cursor, sql, fileobj):
+    """
+    Runs a COPY ... FROM STDIN statement reading its input from fileobj,
+    with either psycopg2 or psycopg 3.
+    """
+    if hasattr(cursor, 'copy_expert'):
+        cursor.copy_expert(sql, fileobj, size=COPY_CHUNK_SIZE)
+    else:
+        with cursor.copy(sql) as copy:
+            while True:
+                data = fileobj.read(COPY_CHUNK_SIZE)
+                if not data:
+                    break
+                copy.write(data)
+
+
+def _qualified_name(schema_name, table):
+    return '%s.%s' % (schema_name, connection.ops.quote_name(table))
+
+
+def _columns_list(columns):
+    return ', '.join(connection.ops.quote_name(column) for column in columns)
+
+
+def _export_table(cursor, schema_name, table, path):
+    """
+    Writes the rows of a table gzipped in the binary COPY format.
+    """
+    with gzip.open(path, 'wb') as fileobj:
+        copy_to(cursor, 'COPY %s (%s) TO STDOUT (FORMAT binary)' % (
+            _qualified_name(schema_name, table['name']), _columns_list(table['columns'])),
+            fileobj)
+
+
+def _export_table_in_snapshot(snapshot, schema_name, table, path):
+    """
+    Exports a table as seen by the snapshot. Runs in a thread with its own
+    connection.
+    """
+    try:
+        # Sets the search_path before the transaction, whose first query
+        # has to be SET TRANSACTION SNAPSHOT.
+        connection.cursor()
+        with transaction.atomic():
+            cursor = connection.cursor()
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+            cursor.execute("SET TRANSACTION SNAPSHOT '%s'" % snapshot)
+            _export_table(cursor, schema_name, table, path)
+    finally:
+        connection.close()
+
+
+def _get_manifest(cursor, schema_name):
+    cursor.execute(TABLES_SQL, (schema_name, ))
+    tables = cursor.fetchall()
+    cursor.execute(SEQUENCES_SQL, (schema_name, ))
+    sequences = cursor.fetchall()
+    return {
+        'version': ARCHIVE_VERSION,
+        'schema_name': schema_name,
+        'tables': [
+            {'name': name, 'columns': columns, 'file': 'tables/%d.copy.gz' % i}
+            for i, (name, columns, has_identity) in enumerate(tables)
+        ],
+        'sequences': [
+            {'name': name, 'last_value': last_value, 'identity': deptype == 'i',
+             'table': table, 'column': column}
+            for name, *_, last_value, deptype, table, column in sequences
+        ],
+    }
+
+
+def export_schema(schema_name, path, workers=None):
+    """
+    Exports every table and sequence value of the schema to a tar archive
+    at path, streaming the tables with COPY (FORMAT binary).
+
+    Tables are exported from workers threads that all read the same
+    snapshot, so the archive is consistent. Inside a transaction, which
+    the export has to be part of, they are exported one at a time instead.
+
+    The archive contains a manifest.json describing the tables and
+    sequences and a gzipped COPY payload per table. Returns the manifest.
+    """
+    _check_schema_name(schema_name)
+    if workers is None:
+        workers = get_export_workers()
+
+    directory = tempfile.mkdtemp()
+    os.mkdir(os.path.join(directory, 'tables'))
+    try:
+        if connection.in_atomic_block:
+            cursor = connection.cursor()
+            manifest = _get_manifest(cursor, schema_name)
+            for table in manifest['tables']:
+                _export_table(cursor, schema_name, table,
+                              os.path.join(directory, table['file']))
+        else:
+            # see _export_table_in_snapshot
+            connection.cursor()
+            with transaction.atomic():
+                cursor = connection.cursor()
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+                cursor.execute('SELECT pg_catalog.pg_export_snapshot()')
+                snapshot = cursor.fetchone()[0]
+                manifest = _get_manifest(cursor, schema_name)
+
+                # The snapshot can only be used while this transaction is open.
+                with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+                    futures = [
+                        executor.submit(_export_table_in_snapshot, snapshot, schema_name, table,
+                                        os.path.join(directory, table['file']))
+                        for table in manifest['tables']
+                    ]
+                    for future in futures:
+                        future.result()
+
+        with tarfile.open(path, 'w') as archive:
+            data = json.dumps(manifest, indent=2).encode('utf-8')
+            info = tarfile.TarInfo(MANIFEST_NAME)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+            for table in manifest['tables']:
+                archive.add(os.path.join(directory, table['file']), table['file'])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return manifest
+
+
+def create_empty_schema(schema_name, verbosity=1, using=DEFAULT_DB_ALIAS):
+    """
+    Creates a schema with the tables of the tenant apps but no rows in the
+    database using, cloned from the template schema if there is one,
+    migrated otherwise.
+    """
+    _check_schema_name(schema_name)
+    template_schema_name = get_template_schema_name()
+    if template_schema_name and using == DEFAULT_DB_ALIAS:
+        create_template_schema(verbosity=verbosity)
+        clone_schema(template_schema_name, schema_name, include_data=False)
+    else:
+        connections[using].cursor().execute('CREATE SCHEMA %s' % schema_name)
+        call_command('migrate_schemas',
+                     schema_name=schema_name,
+                     database=using,
+                     interactive=False,
+                     verbosity=verbosity)
+        connections[using].set_schema_to_public()
+
+
+def _set_sequences(cursor, schema_name, sequences):
+    for sequence in sequences:
+        if sequence['last_value'] is None:
+            continue
+        if sequence['identity']:
+            # Identity sequences may have been given another name.
+            cursor.execute('SELECT setval(pg_get_serial_sequence(%s, %s), %s)', (
+                _qualified_name(schema_name, sequence['table']), sequence['column'],
+                sequence['last_value']))
+        else:
+            cursor.execute('SELECT setval(%s, %s)', (
+                _qualified_name(schema_name, sequence['name']), sequence['last_value']))
+
+
+def load_schema_data(schema_name, tables, sequences, open_table):
+    """
+    Replaces the rows of the schema's tables with the binary COPY payloads
+    returned by open_table(table) and sets the sequence values, in a single
+    transaction. Foreign keys created by Django are deferred to the commit.
+    """
+    with transaction.atomic():
+        cursor = connection.cursor()
+        cursor.execute(TABLES_SQL, (schema_name, ))
+        existing = [row[0] for row in cursor.fetchall()]
+        missing = [table['name'] for table in tables if table['name'] not in existing]
+        if missing:
+            raise ValueError("Tables %s don't exist in schema %s." % (
+                ', '.join(missing), schema_name))
+
+        if existing:
+            cursor.execute('TRUNCATE %s' % ', '.join(
+                _qualified_name(schema_name, table) for table in existing))
+
+        for table in tables:
+            with open_table(table) as fileobj:
+                copy_from(cursor, 'COPY %s (%s) FROM STDIN (FORMAT binary)' % (
+                    _qualified_name(schema_name, table['name']),
+                    _columns_list(table['columns'])), fileobj)
+
+        _set_sequences(cursor, schema_name, sequences)
+
+
+def import_schema(path, schema_name=None, verbosity=1):
+    """
+    Restores an archive written by export_schema into a new schema, named
+    like the exported one unless schema_name is given. The schema is
+    created empty, then the rows are copied in a single transaction. If
+    anything fails the schema is dropped. Returns the schema name.
+    """
+    with tarfile.open(path, 'r') as archive:
+        manifest = json.load(archive.extractfile(MANIFEST_NAME))
+        if manifest['version'] != ARCHIVE_VERSION:
+            raise ValueError('Unsupported archive version %s.' % manifest['version'])
+
+        schema_name = schema_name or manifest['schema_name']
+        _check_schema_name(schema_name)
+        if schema_exists(schema_name):
+            raise ValueError('Schema %s already exists.' % schema_name)
+
+        try:
+            create_empty_schema(schema_name, verbosity=verbosity)
+            load_schema_data(schema_name, manifest['tables'], manifest['sequences'],
+                             lambda table: gzip.open(archive.extractfile(table['file'])))
+        except Exception:
+            connection.set_schema_to_public()
+            connection.cursor().execute('DROP SCHEMA IF EXISTS %s CASCADE' % schema_name)
+            raise
+
+    return schema_name
+
+
+def copy_between(source_cursor, source_sql, target_cursor, target_sql):
+    """
+    Streams the output of a COPY ... TO STDOUT on source_cursor into a
+    COPY ... FROM STDIN on target_cursor, without going through the disk.
+    """
+    if hasattr(source_cursor, 'copy_expert'):
+        # psycopg2 only copies to and from files, connect both with a pipe.
+        read_fd, write_fd = os.pipe()
+
+        def write():
+            with os.fdopen(write_fd, 'wb') as fileobj:
+                copy_to(source_cursor, source_sql, fileobj)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(write)
+            with os.fdopen(read_fd, 'rb') as fileobj:
+                copy_from(target_cursor, target_sql, fileobj)
+            future.result()
+    else:
+        with source_cursor.copy(source_sql) as source, target_cursor.copy(target_sql) as target:
+            for data in source:
+                target.write(data)
+
+
+def _copy_table(source_cursor, target_cursor, schema_name, table):
+    name, columns = _qualified_name(schema_name, table['name']), _columns_list(table['columns'])
+    copy_between(source_cursor, 'COPY %s (%s) TO STDOUT (FORMAT binary)' % (name, columns),
+                 target_cursor, 'COPY %s (%s) FROM STDIN (FORMAT binary)' % (name, columns))
+
+
+def _fingerprint(cursor, schema_name, table):
+    """
+    Returns the number of rows of the table and the sum of their hashes.
+    """
+    cursor.execute(
+        'SELECT count(*), coalesce(sum(hashtextextended(ROW(%s)::text, 0)), 0) FROM %s' % (
+            _columns_list(table['columns']), _qualified_name(schema_name, table['name'])))
+    return cursor.fetchone()
+
+
+PRIMARY_KEY_SQL = """
+SELECT a.attname
+FROM pg_catalog.pg_index i
+JOIN pg_catalog.pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+WHERE i.indrelid = %s::regclass AND i.indisprimary
+ORDER BY array_position(i.indkey::int2[], a.attnum)
+"""
+
+# The catch-up of move_tenant spreads the rows of a table over buckets of
+# about this many rows, compares the buckets and then the rows of the
+# buckets that differ, a few buckets at a time.
+CATCH_UP_BUCKET_ROWS = 1000
+CATCH_UP_BUCKETS_AT_ONCE = 100
+
+
+def _bucket_hashes(cursor, name, columns, bucket):
+    """
+    Returns the number of rows and the sum of their hashes of every bucket
+    of the table, computed by the database.
+    """
+    cursor.execute('SELECT %s, count(*), sum(hashtextextended(ROW(%s)::text, 0)) FROM %s '
+                   'GROUP BY 1' % (bucket, columns, name))
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+
+def _row_hashes(cursor, name, columns, key, bucket, buckets):
+    """
+    Returns the hash of every row of the buckets, keyed by primary key.
+    """
+    cursor.execute('SELECT %s, hashtextextended(ROW(%s)::text, 0) FROM %s WHERE %s = ANY(%%s)'
+                   % (key, columns, name, bucket), (buckets, ))
+    return dict(cursor.fetchall())
+
+
+def _copy_changed_rows(source_cursor, target_cursor, name, columns, key, bucket, buckets):
+    """
+    Copies the rows of the buckets that differ in the target, found by
+    comparing the hashes of the rows with the same primary key. The rows
+    to copy are selected with their keys stored in a temporary table of
+    the source transaction.
+    """
+    source_rows = _row_hashes(source_cursor, name, columns, key, bucket, buckets)
+    target_rows = _row_hashes(target_cursor, name, columns, key, bucket, buckets)
+    stale = [row_key for row_key, row_hash in target_rows.items()
+             if source_rows.get(row_key) != row_hash]
+    if stale:
+        target_cursor.execute('DELETE FROM %s WHERE %s = ANY(%%s)' % (name, key), (stale, ))
+    changed = [(row_key, ) for row_key, row_hash in source_rows.items()
+               if target_rows.get(row_key) != row_hash]
+    if changed:
+        source_cursor.execute('CREATE TEMPORARY TABLE IF NOT EXISTS ts_moved_rows (key text) '
+                              'ON COMMIT DROP')
+        source_cursor.execute('TRUNCATE ts_moved_rows')
+        source_cursor.executemany('INSERT INTO ts_moved_rows VALUES (%s)', changed)
+        copy_between(
+            source_cursor,
+            'COPY (SELECT %s FROM %s WHERE %s IN (SELECT key FROM ts_moved_rows)) '
+            'TO STDOUT (FORMAT binary)' % (columns, name, key),
+            target_cursor, 'COPY %s (%s) FROM STDIN (FORMAT binary)' % (name, columns))
+
+
+def _catch_up(source_cursor, target_cursor, schema_name, tables, bucket_counts):
+    """
+    Copies the rows that differ between the source and the target tables.
+    The buckets of rows are compared by the database, so only the rows of
+    the buckets that changed are read, a few buckets at a time. Tables
+    without primary key are copied again if they changed. bucket_counts
+    keeps the number of buckets of each table, counted on first use, so
+    that a later catch-up doesn't count the rows again.
+    """
+    for table in tables:
+        name = _qualified_name(schema_name, table['name'])
+        columns = _columns_list(table['columns'])
+        source_cursor.execute(PRIMARY_KEY_SQL, (name, ))
+        key_columns = [row[0] for row in source_cursor.fetchall()]
+        if not key_columns:
+            if (_fingerprint(source_cursor, schema_name, table) !=
+                    _fingerprint(target_cursor, schema_name, table)):
+                target_cursor.execute('DELETE FROM %s' % name)
+                _copy_table(source_cursor, target_cursor, schema_name, table)
+            continue
+
+        if table['name'] not in bucket_counts:
+            source_cursor.execute('SELECT count(*) FROM %s' % name)
+            bucket_counts[table['name']] = max(
+                1, source_cursor.fetchone()[0] // CATCH_UP_BUCKET_ROWS)
+        key = 'ROW(%s)::text' % _columns_list(key_columns)
+        bucket = 'abs(mod(hashtextextended(%s, 1), %d))' % (key, bucket_counts[table['name']])
+
+        source_buckets = _bucket_hashes(source_cursor, name, columns, bucket)
+        target_buckets = _bucket_hashes(target_cursor, name, columns, bucket)
+        changed = sorted(number for number in set(source_buckets) | set(target_buckets)
+                         if source_buckets.get(number) != target_buckets.get(number))
+        for i in range(0, len(changed), CATCH_UP_BUCKETS_AT_ONCE):
+            _copy_changed_rows(source_cursor, target_cursor, name, columns, key, bucket,
+                               changed[i:i + CATCH_UP_BUCKETS_AT_ONCE])
+
+
+def get_move_lock_timeout():
+    return getattr(settings, 'TENANT_MOVE_LOCK_TIMEOUT', 5000)
+
+
+def move_tenant(tenant, database, lock_timeout=None, verbosity=1):
+    """
+    Moves the schema of a tenant inheriting MultiDatabaseTenantMixin to the
+    database alias database and switches the tenant to it.
+
+    The target schema is migrated and every table is streamed to it with
+    COPY from a consistent snapshot while the tenant keeps being used, then
+    the rows changed during the copy are copied again. Then the tables of
+    the source schema are locked in SHARE mode, making the tenant
+    read-only, and the rows that changed since, found by comparing hashes
+    computed by the databases, are copied again along with the sequence
+    values.
+    The source schema is dropped before the tenant's database is switched
+    and the drop committed, so writes waiting for the locks fail instead
+    of being lost.
+    """
+    source, target = tenant.database, database
+    schema_name = tenant.schema_name
+    _check_schema_name(schema_name)
+    if source == target:
+        raise ValueError('Tenant %s is already in database %s.' % (schema_name, target))
+    if any(connections[alias].in_atomic_block for alias in (DEFAULT_DB_ALIAS, source, target)):
+        raise TransactionManagementError("Tenants can't be moved inside a transaction.")
+    if schema_exists(schema_name, using=target):
+        raise ValueError('Schema %s already exists in database %s.' % (schema_name, target))
+    if lock_timeout is None:
+        lock_timeout = get_move_lock_timeout()
+
+    source_connection, target_connection = connections[source], connections[target]
+    source_connection.set_schema_to_public()
+    target_connection.set_schema_to_public()
+
+    create_empty_schema(schema_name, verbosity=verbosity, using=target)
+    switched = False
+    try:
+        # see _export_table_in_snapshot
+        source_connection.cursor()
+        with transaction.atomic(using=source), transaction.atomic(using=target):
+            source_cursor = source_connection.cursor()
+            source_cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+            tables = _get_manifest(source_cursor, schema_name)['tables']
+            target_cursor = target_connection.cursor()
+            target_cursor.execute(TABLES_SQL, (schema_name, ))
+            existing = [row[0] for row in target_cursor.fetchall()]
+            if existing:
+                target_cursor.execute('TRUNCATE %s' % ', '.join(
+                    _qualified_name(schema_name, table) for table in existing))
+            for table in tables:
+                _copy_table(source_cursor, target_cursor, schema_name, table)
+
+        # A first catch-up while the tenant is writable, so that the one
+        # holding the locks only copies the rows changed in the meantime.
+        bucket_counts = {}
+        with transaction.atomic(using=source), transaction.atomic(using=target):
+            _catch_up(source_connection.cursor(), target_connection.cursor(), schema_name,
+                      tables, bucket_counts)
+
+        with transaction.atomic(using=source):
+            source_cursor = source_connection.cursor()
+            source_cursor.execute("SELECT set_config('lock_timeout', %s, true)",
+                                  ('%dms' % lock_timeout, ))
+            manifest = _get_manifest(source_cursor, schema_name)
+            if manifest['tables']:
+                source_cursor.execute('LOCK TABLE %s IN SHARE MODE' % ', '.join(
+                    _qualified_name(schema_name, table['name'])
+                    for table in manifest['tables']))
+
+            with transaction.atomic(using=target):
+                target_cursor = target_connection.cursor()
+                _catch_up(source_cursor, target_cursor, schema_name, manifest['tables'],
+                          bucket_counts)
+                _set_sequences(target_cursor, schema_name, manifest['sequences'])
+
+            # Once the switch is committed, no write can reach the source.
+            source_cursor.execute('DROP SCHEMA %s CASCADE' % schema_name)
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                type(tenant).objects.using(DEFAULT_DB_ALIAS).filter(pk=tenant.pk).update(
+                    database=target)
+            # unless it is part of this transaction, the switch is committed
+            switched = source != DEFAULT_DB_ALIAS
+        switched = True
+    except Exception:
+        if not switched:
+            target_connection.cursor().execute('DROP SCHEMA IF EXISTS %s CASCADE' % schema_name)
+        raise
+
+    tenant.database = target
+    return tenant
@@ -1,12 +1,17 @@
+import zlib
 from contextlib import contextmanager
 
 from django.conf import settings
-from django.db import connection
+from django.db import DEFAULT_DB_ALIAS, connection, connections
 
 from django.apps import apps, AppConfig
 get_model = apps.get_model
 from django.core import mail
 
+# First key of the advisory locks taken by tenant_schemas, the second one
+# identifies the locked object.
+ADVISORY_LOCK_ID = 7465
+
 
 @contextmanager
 def schema_context(schema_name):
@@ -42,6 +47,53 @@ def get_public_schema_name():
     return getattr(settings, 'PUBLIC_SCHEMA_NAME', 'public')
 
 
+def get_template_schema_name():
+    return getattr(settings, 'TENANT_TEMPLATE_SCHEMA', None)
+
+
+def get_app_set_apps(app_set):
+    """
+    Returns the apps of the app set of TENANT_APP_SETS, or TENANT_APPS if
+    app_set is empty.
+    """
+    if app_set:
+        return getattr(settings, 'TENANT_APP_SETS', {})[app_set]
+    return settings.TENANT_APPS
+
+
+def get_tenant_apps(tenant=None):
+    """
+    Returns the apps whose tables are in the schema of the tenant, from its
+    app_set.
+    """
+    return get_app_set_apps(getattr(tenant, 'app_set', None))
+
+
+def get_app_sets(schema_names):
+    """
+    Returns the app set of the tenants of the given schemas that have one,
+    keyed by schema name, read with a single query. Empty without
+    TENANT_APP_SETS or before the tenant table is created.
+    """
+    public_schema_name = get_public_schema_name()
+    schema_names = [schema_name for schema_name in schema_names
+                    if schema_name != public_schema_name]
+    if not getattr(settings, 'TENANT_APP_SETS', None) or not schema_names:
+        return {}
+
+    model = get_tenant_model()
+    cursor = connection.cursor()
+    cursor.execute('SELECT to_regclass(%s)', (
+        '%s.%s' % (public_schema_name, connection.ops.quote_name(model._meta.db_table)), ))
+    if cursor.fetchone()[0] is None:
+        return {}
+
+    # app_set may be a property, so the tenants are loaded.
+    return {tenant.schema_name: tenant.app_set
+            for tenant in model.objects.filter(schema_name__in=schema_names)
+            if getattr(tenant, 'app_set', None)}
+
+
 def get_limit_set_calls():
     return getattr(settings, 'TENANT_LIMIT_SET_CALLS', False)
 
@@ -84,22 +136,70 @@ def django_is_in_test_mode():
     return hasattr(mail, 'outbox')
 
 
-def schema_exists(schema_name):
-    cursor = connection.cursor()
+def schemas_exist(schema_names, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the set of the given schema names that exist in the database
+    using, checked with a single query.
+
+    Unquoted identifiers are folded to lower case by PostgreSQL, so the
+    names are compared in lower case, against the pg_namespace name index.
+    """
+    schema_names = list(schema_names)
+    if not schema_names:
+        return set()
+
+    cursor = connections[using].cursor()
+    cursor.execute('SELECT nspname FROM pg_catalog.pg_namespace WHERE nspname = ANY(%s)',
+                   ([schema_name.lower() for schema_name in schema_names], ))
+    existing = {row[0] for row in cursor.fetchall()}
+    cursor.close()
 
-    # check if this schema already exists in the db
-    sql = 'SELECT EXISTS(SELECT 1 FROM pg_catalog.pg_namespace WHERE LOWER(nspname) = LOWER(%s))'
-    cursor.execute(sql, (schema_name, ))
+    return {schema_name for schema_name in schema_names if schema_name.lower() in existing}
 
-    row = cursor.fetchone()
-    if row:
-        exists = row[0]
-    else:
-        exists = False
 
+def schema_exists(schema_name, using=DEFAULT_DB_ALIAS):
+    return schema_name in schemas_exist([schema_name], using=using)
+
+
+def schema_sizes(schema_names, using=DEFAULT_DB_ALIAS):
+    """
+    Returns a dict of the size in bytes of the tables of each of the given
+    schemas, with their indexes and TOAST tables, read with a single query.
+    The names are compared in lower case, like in schemas_exist.
+    """
+    schema_names = list(schema_names)
+    if not schema_names:
+        return {}
+
+    cursor = connections[using].cursor()
+    cursor.execute('SELECT n.nspname, coalesce(sum(pg_total_relation_size(c.oid)), 0) '
+                   'FROM pg_catalog.pg_namespace n '
+                   'LEFT JOIN pg_catalog.pg_class c '
+                   "ON c.relnamespace = n.oid AND c.relkind IN ('r', 'm') "
+                   'WHERE n.nspname = ANY(%s) GROUP BY n.nspname',
+                   ([schema_name.lower() for schema_name in schema_names], ))
+    sizes = {row[0]: int(row[1]) for row in cursor.fetchall()}
     cursor.close()
 
-    return exists
+    return {schema_name: sizes.get(schema_name.lower(), 0) for schema_name in schema_names}
+
+
+def schema_shard(schema_name, count):
+    """
+    Returns the shard, from 1 to count, of the schema. It only depends on
+    the schema name, so every machine computes the same shards.
+    """
+    return zlib.crc32(schema_name.encode()) % count + 1
+
+
+def is_lock_timeout(error):
+    """
+    Returns true if the database error was raised because lock_timeout
+    expired (SQLSTATE 55P03, lock_not_available).
+    """
+    cause = getattr(error, '__cause__', None)
+    sqlstate = getattr(cause, 'sqlstate', None) or getattr(cause, 'pgcode', None)
+    return sqlstate == '55P03'
 
 
 def app_labels(apps_list):
@@ -0,0 +1,41 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('tenant_schemas.workers')
+
+_executor = None
+
+
+def get_executor():
+    """
+    Returns the thread pool used for background work, created on first use
+    with TENANT_BACKGROUND_WORKERS threads.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'TENANT_BACKGROUND_WORKERS', 2),
+            thread_name_prefix='tenant_schemas',
+        )
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Runs fn in a background thread and returns its future. The thread gets
+    its own database connections, which are closed once fn returns.
+    """
+    return get_executor().submit(_run, fn, *args, **kwargs)
+
+
+def _run(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', getattr(fn, '__name__', fn))
+        raise
+    finally:
+        connections.close_all()